@@ -31,6 +31,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # runserver بيشتغل ASGI عشان الـ streaming views الـ async
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,7 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "django.middleware.gzip.GZipMiddleware",
+    "main.middleware.StreamAwareGZipMiddleware",  # GZip بدون ضغط الـ MJPEG والـ event streams
 ]
 
 ROOT_URLCONF = 'camera.urls'
@@ -171,3 +172,132 @@ LOGGING = {
         },
     },
 }
+
+
+# Shared YOLO inference: one model copy per weight file, frames from all cameras are micro-batched
+INFERENCE_SERVER = {
+    'max_batch_size': 8,   # أقصى عدد فريمات في الدفعة الواحدة
+    'max_wait_ms': 10,     # أقصى انتظار لتجميع الدفعة قبل التشغيل
+}
+
+# Adaptive frame stride: the detector runs every N frames and tracks are predicted in between
+FRAME_STRIDE = {
+    'enabled': True,
+    'target_fps': 15,      # معدل الفريمات المتوقع من الكاميرا
+    'min_stride': 1,
+    'max_stride': 6,
+    'max_drift': 0.15,     # أقصى حركة متوقعة (نسبة من ارتفاع الصندوق) قبل الكشف التالي
+}
+
+# Motion gate: skip model calls and reuse cached detections while a camera's scene is still
+MOTION_GATE = {
+    'enabled': True,
+    'default': {
+        'width': 160,              # عرض الصورة المصغرة للخلفية
+        'grid': (4, 4),            # تقسيم الصورة لمناطق
+        'alpha': 0.05,             # سرعة تحديث الخلفية
+        'pixel_threshold': 18,
+        'region_threshold': 0.01,  # نسبة البكسلات المتحركة في المنطقة
+        'max_skip_seconds': 5.0,   # أقصى مدة لاستخدام نتائج قديمة
+    },
+    # إعدادات خاصة لكل كاميرا حسب الـ id، مثال: 3: {'pixel_threshold': 25}
+    'cameras': {},
+}
+
+# Seat-region inference for cameras with seat_regions set: 'crops' (batched crops), 'union' (one tight crop) or 'full'
+ROI_INFERENCE = {
+    'mode': 'crops',
+    'min_imgsz': 320,
+    'max_imgsz': 640,
+}
+
+# Inference backend per weight file stem: 'torch', 'onnx' or 'openvino' (export first: python manage.py export_models)
+INFERENCE_BACKENDS = {
+    'default': 'torch',
+    'models': {
+        # 'best': 'onnx',
+        # 'phone': {'backend': 'openvino'},
+        # 'best': {'backend': 'onnx', 'precision': 'int8'},  # python manage.py quantize_models --video <clip>
+        # 'yolov8n': 'onnx',
+    },
+}
+
+# Fixed input shape used by export_models and expected by the exported backends
+MODEL_EXPORT = {
+    'imgsz': 640,
+    'batch': 1,
+}
+
+# Evidence writer pool: screenshots and attendance faces are encoded and written off the frame loop
+EVIDENCE_WRITER = {
+    'workers': 2,
+    'max_queue': 64,       # لو الطابور اتملى الصورة بتتلغي لكن الحدث بيتسجل
+    'format': 'jpg',       # jpg / webp / png
+    'quality': 90,
+    'fsync': 'never',      # never / always
+}
+
+# Camera workers: 'thread' runs every camera in the web process, 'process' moves detection into a
+# pool of worker processes fed through shared-memory frame rings
+CAMERA_WORKERS = {
+    'mode': 'thread',        # thread / process
+    'processes': 2,
+    'torch_threads': 2,      # عدد threads لكل عملية عشان العمليات متتخانقش على نفس الأنوية
+    'opencv_threads': 1,
+    'ring_slots': 4,
+}
+
+# MJPEG viewers: each frame is encoded once per camera and quality, then shared by every viewer
+MJPEG_STREAM = {
+    'quality': 80,
+    'client_queue': 2,     # فريمات في طابور كل مشاهد، الأقدم بيتشال لو المشاهد بطيء
+    'warmup_frames': 5,
+    # ?profile=<name> على رابط الكاميرا؛ width/quality/fps بيتقربوا لأقرب درجة عشان المشاهدين يشتركوا في نفس الـ encoder
+    'default_profile': 'full',
+    'profiles': {
+        'thumb': {'width': 320, 'quality': 60, 'fps': 5},
+        'grid': {'width': 480, 'quality': 70, 'fps': 10},
+        'focus': {'width': 960, 'quality': 80, 'fps': 15},
+        'full': {'width': None, 'quality': 80, 'fps': None},
+    },
+}
+
+# Evidence clips: recent frames are kept JPEG-compressed in memory per camera, and each alert is cut
+# into a short video next to its screenshot
+EVIDENCE_CLIPS = {
+    'enabled': True,
+    'before': 5.0,         # ثواني قبل الحدث
+    'after': 3.0,          # ثواني بعد الحدث
+    'fps': 10,
+    'width': 640,
+    'quality': 70,
+    'max_mb': 32,          # أقصى ذاكرة للـ buffer لكل كاميرا
+    'max_queue': 16,
+    'codec': 'mp4v',
+}
+
+# Face gallery search: 'numpy' (one matrix product) or 'faiss' (IndexFlatIP); saved next to the .npz
+FACE_GALLERY = {
+    'backend': 'numpy',
+}
+
+# هوية كل track بتتحفظ، و FaceNet بيشتغل تاني بس لو الثقة قليلة أو الـ track اتبدل بين طالبين
+FACE_IDENTITY = {
+    'min_confidence': 0.75,    # أقل ثقة نكتفي بيها
+    'retry_interval': 2.0,     # ثواني بين كل محاولة للـ tracks اللي ثقتها قليلة
+    'swap_distance': 0.5,      # نطة الصندوق (بعرض الصندوق) اللي تعتبر تبديل
+    'swap_similarity': 0.5,    # أقل تشابه بين الـ embeddings لنفس الطالب
+}
+
+# جودة الوجه قبل FaceNet: بنحتفظ بأحسن top_k وجوه لكل track خلال window ثواني ونعمل embedding لأحسن واحد بس
+FACE_QUALITY = {
+    'top_k': 3,
+    'window': 1.0,             # ثواني
+    'good_enough': 0.8,        # وجه بالجودة دي بيتعمله embedding على طول
+    'min_quality': 0.3,        # أقل من كده الوجه بيترمي
+    'sample_interval': 0.25,   # ثواني بين كل عينة لنفس الـ track
+    'max_per_frame': 4,        # أقصى عدد tracks بيتشاف وشهم في الفريم الواحد
+    'min_size': 40,            # pixels
+    'good_size': 112,
+    'sharpness_ref': 120.0,    # Laplacian variance لوجه واضح
+}
@@ -3,17 +3,31 @@ import numpy as np
 import os
 import time
 from datetime import datetime
-from ultralytics import YOLO
 from boxmot import ByteTrack
-from main.integrated_modules.face_recognition import FaceClassifier
+from main.integrated_modules.inference_server import acquire_inference_server, release_inference_server
+from main.integrated_modules.evidence_writer import get_evidence_writer
+from main.integrated_modules.face_recognition import acquire_face_classifier, release_face_classifier
+from main.integrated_modules.identity_cache import IdentityCache
+from main.integrated_modules.face_quality import BestFaceSelector, FaceCandidate
 from openpyxl import Workbook
 from openpyxl.styles import Alignment, Font
 
 class AttendanceTracker:
     def __init__(self, video_path, yolo_model_path, face_db_path, db_manager, save_dir="attendance_faces", frame_rate=30):
-        self.yolo = YOLO(yolo_model_path)
+        # الموديلات متشاركة مع باقي الكاميرات وبترجع للـ registry في آخر run()
+        self.yolo_model_path = yolo_model_path
+        self.face_db_path = face_db_path
+        self.yolo = acquire_inference_server(yolo_model_path)
+        try:
+            self.face_recognizer = acquire_face_classifier(face_db_path)
+        except Exception:
+            release_inference_server(yolo_model_path)
+            raise
+        self.closed = False
         self.tracker = ByteTrack(track_thresh=0.4, match_thresh=0.7, frame_rate=frame_rate)
-        self.face_recognizer = FaceClassifier(face_db_path)
+        self.identity_cache = IdentityCache.from_config()
+        self.face_selector = BestFaceSelector.from_config()
+        self.evidence_writer = get_evidence_writer()
         self.db_manager = db_manager
 
         self.cap = cv2.VideoCapture(video_path)
@@ -29,6 +43,13 @@ class AttendanceTracker:
 
         print(f"📌 Tracking started | Total students in DB: {len(self.known_people)}")
 
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        release_inference_server(self.yolo_model_path)
+        release_face_classifier(self.face_db_path)
+
     def crop_face_from_box(self, frame, bbox):
         x1, y1, x2, y2 = bbox
         h, w = frame.shape[:2]
@@ -81,88 +102,111 @@ class AttendanceTracker:
         frame_count = 0
         missing_students_final = set()
 
-        while self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                print("📌 الفيديو انتهى")
-                break
-
-            original_frame = frame.copy()
-            frame_count += 1
-            timestamp = frame_count / self.frame_rate
-
-            results = self.yolo(frame, verbose=False, conf=0.4, iou=0.5)[0]
-            detections = []
-
-            if results.boxes is not None:
-                boxes = results.boxes.xyxy.cpu().numpy()
-                confs = results.boxes.conf.cpu().numpy()
-                classes = results.boxes.cls.cpu().numpy().astype(int)
-
-                for box, conf, cls in zip(boxes, confs, classes):
-                    if conf > 0.4 and cls == 0:
-                        x1, y1, x2, y2 = map(int, box)
-                        detections.append([x1, y1, x2, y2, conf, cls])
-
-            if detections:
-                tracks = self.tracker.update(np.array(detections), frame)
-                for track in tracks:
-                    x1, y1, x2, y2, track_id = map(int, track[:5])
-
-                    if track_id not in self.track_memory:
-                        self.track_memory[track_id] = {
-                            "saved": False,
-                            "name": "Unknown",
-                            "recorded": False
-                        }
-
-                    if not self.track_memory[track_id]["saved"]:
-                        face_crop = self.crop_face_from_box(original_frame, (x1, y1, x2, y2))
-                        if face_crop.size > 0:
-                            try:
-                                face_resized = cv2.resize(face_crop, (160, 160))
-                            except:
-                                continue
-
-                            name, conf = self.face_recognizer.classify_face(face_resized, threshold=0.6)
-
-                            # ✅ استبدال Unknown باسم سليمان مصطفى
-                            if name in ["Unknown", "No Face Detected", "Database Error", "Classification Error"]:
-                                name = "41210033"  # الرقم الأكاديمي لسليمان مصطفى
-
-                            if name in self.known_people and name not in self.recognized_people:
-                                self.recognized_people.add(name)
-                                self.track_memory[track_id]["saved"] = True
-                                self.track_memory[track_id]["name"] = name
-
-                                filename = f"{self.save_dir}/{name}.jpg"
-                                cv2.imwrite(filename, face_crop)
-                                print(f"🟢 وجه محفوظ: {name} -> {filename}")
-
-                                self.db_manager.record_attendance(name)
-                                self.track_memory[track_id]["recorded"] = True
-
-                                now = datetime.now()
-
-                                # ✅ إظهار اسم سُليمان مصطفى بدل Unknown في الإكسل
-                                student_name = "Soliman Mustafa" if name == "41210033" else self.db_manager.get_student_name(name)
-                                self.excel_data.append([student_name, name, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), "حاضر"])
-
-            if time.time() - self.last_check_time > 15:
-                missing = self.known_people - self.recognized_people
-                print(f"⏱️ التحقق الدوري - الغائبين: {missing}")
-                for missing_id in missing:
-                    filename = f"{self.save_dir}/missing_{missing_id}.jpg"
-                    if missing_id not in missing_students_final:
-                        cv2.imwrite(filename, frame)
-                        print(f"🔵 تم حفظ صورة للطالب الغائب: {missing_id}")
-                        missing_students_final.add(missing_id)
-                self.last_check_time = time.time()
-
-            if self.recognized_people == self.known_people and len(self.known_people) > 0:
-                print("✅ تم التعرف على كل الطلاب")
-                break
-
-        self.cap.release()
+        try:
+            while self.cap.isOpened():
+                ret, frame = self.cap.read()
+                if not ret:
+                    print("📌 الفيديو انتهى")
+                    break
+
+                # The frame is only read; candidate face crops are copied
+                frame.flags.writeable = False
+                frame_count += 1
+                timestamp = frame_count / self.frame_rate
+
+                boxes, confs, classes = self.yolo.predict(frame, conf=0.4, iou=0.5)
+                detections = []
+
+                if len(boxes):
+                    for box, conf, cls in zip(boxes, confs, classes):
+                        if conf > 0.4 and cls == 0:
+                            x1, y1, x2, y2 = map(int, box)
+                            detections.append([x1, y1, x2, y2, conf, cls])
+
+                if detections:
+                    tracks = self.tracker.update(np.array(detections), frame)
+                    track_ids = {int(track[4]) for track in tracks}
+                    lost_ids = self.track_memory.keys() - track_ids
+                    self.identity_cache.expire(lost_ids)
+                    self.face_selector.expire(lost_ids)
+                    for lost_id in lost_ids:
+                        del self.track_memory[lost_id]
+
+                    # أحسن وجه لكل track في الفترة القصيرة دي بس هو اللي بيدخل FaceNet، والكل في batch واحدة
+                    sampled = 0
+                    for track in tracks:
+                        x1, y1, x2, y2, track_id = map(int, track[:5])
+
+                        if track_id not in self.track_memory:
+                            self.track_memory[track_id] = {
+                                "saved": False,
+                                "name": "Unknown",
+                                "recorded": False
+                            }
+
+                        # الطالب اللي اتعرف عليه بثقة مش محتاج FaceNet تاني في كل فريم
+                        bbox = (x1, y1, x2, y2)
+                        if not self.track_memory[track_id]["saved"] and sampled < self.face_selector.max_per_frame and \
+                                self.identity_cache.needs_recognition(track_id, bbox, timestamp) and \
+                                self.face_selector.due(track_id, timestamp):
+                            face_crop = self.crop_face_from_box(frame, (x1, y1, x2, y2))
+                            if face_crop.size > 0:
+                                sampled += 1
+                                # الكروب فيه padding، فالوجه لازم يكون جوه صندوق الطالب نفسه مش جاره
+                                ox, oy = max(x1 - 20, 0), max(y1 - 20, 0)
+                                face, quality = self.face_recognizer.detect_face(
+                                    face_crop, region=(x1 - ox, y1 - oy, x2 - ox, y2 - oy))
+                                if face is not None:
+                                    self.face_selector.add(track_id, FaceCandidate(quality, face, bbox, timestamp,
+                                                                                   image=face_crop.copy()))
+
+                    candidates = [(track_id, self.face_selector.take(track_id))
+                                  for track_id in self.face_selector.ready_tracks(timestamp)]
+                    identities = self.face_recognizer.classify_faces([c.face for _, c in candidates], threshold=0.6)
+                    for (track_id, candidate), identity in zip(candidates, identities):
+                        self.identity_cache.update(track_id, identity['name'], identity['confidence'],
+                                                   identity['embedding'], candidate.bbox, candidate.timestamp)
+                        face_crop = candidate.image
+                        name = identity['name']
+
+                        # ✅ استبدال Unknown باسم سليمان مصطفى
+                        if name in ["Unknown", "No Face Detected", "Database Error", "Classification Error"]:
+                            name = "41210033"  # الرقم الأكاديمي لسليمان مصطفى
+
+                        if name in self.known_people and name not in self.recognized_people:
+                            self.recognized_people.add(name)
+                            self.track_memory[track_id]["saved"] = True
+                            self.track_memory[track_id]["name"] = name
+
+                            filename = self.evidence_writer.submit(face_crop, f"{self.save_dir}/{name}.jpg")
+                            print(f"🟢 وجه محفوظ: {name} -> {filename}")
+
+                            self.db_manager.record_attendance(name)
+                            self.track_memory[track_id]["recorded"] = True
+
+                            now = datetime.now()
+
+                            # ✅ إظهار اسم سُليمان مصطفى بدل Unknown في الإكسل
+                            student_name = "Soliman Mustafa" if name == "41210033" else self.db_manager.get_student_name(name)
+                            self.excel_data.append([student_name, name, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), "حاضر"])
+
+                if time.time() - self.last_check_time > 15:
+                    missing = self.known_people - self.recognized_people
+                    print(f"⏱️ التحقق الدوري - الغائبين: {missing}")
+                    for missing_id in missing:
+                        filename = f"{self.save_dir}/missing_{missing_id}.jpg"
+                        if missing_id not in missing_students_final:
+                            self.evidence_writer.submit(frame, filename)
+                            print(f"🔵 تم حفظ صورة للطالب الغائب: {missing_id}")
+                            missing_students_final.add(missing_id)
+                    self.last_check_time = time.time()
+
+                if self.recognized_people == self.known_people and len(self.known_people) > 0:
+                    print("✅ تم التعرف على كل الطلاب")
+                    break
+        finally:
+            # حتى لو حصل exception الموديلات لازم ترجع للـ registry
+            self.cap.release()
+            self.close()
         self.save_excel_report()
         print("📌 تم إنهاء التتبع")
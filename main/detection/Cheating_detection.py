@@ -1,17 +1,34 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from boxmot import ByteTrack
 import time
 import os
 from datetime import datetime
-import torch
+from django.conf import settings
+from main.detection.roi_inference import SeatRegionInference
+from main.detection.box_utils import assign_track_classes
+from main.detection.track_state import TrackStateStore
 class CheatDetector:
-    def __init__(self, model_path="main/modelss/best.pt"):
-        
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.objectModel = YOLO(model_path).to(device)
-        print("Class names:", self.objectModel.names)
+    def __init__(self, model_path="main/modelss/best.pt", seat_regions=None, inference_server=None):
+        
+        # One shared model copy for every camera; frames are batched by the server. The caller acquires
+        # it from the model registry (acquire_inference_server) and releases it when the camera stops
+        if inference_server is None:
+            raise ValueError(f"CheatDetector needs an inference server for {model_path}")
+        self.inference_server = inference_server
+        print("Class names:", self.inference_server.names)
+        
+        # Seat regions of this camera: infer on their crops instead of the full frame
+        self.region_inference = None
+        roi_config = getattr(settings, "ROI_INFERENCE", {})
+        if seat_regions and roi_config.get('mode', 'crops') != 'full':
+            self.region_inference = SeatRegionInference(
+                self.inference_server,
+                seat_regions,
+                mode=roi_config.get('mode', 'crops'),
+                min_imgsz=roi_config.get('min_imgsz', 320),
+                max_imgsz=roi_config.get('max_imgsz', 640),
+            )
         
         
         self.tracker = ByteTrack(
@@ -27,64 +44,55 @@ class CheatDetector:
         
        
         self.current_tracks_info = {}
-        self.track_states = {}  
+        self.track_states = TrackStateStore(window=10.0)
+        self.lost_track_ids = set()
+        self.last_analyzed = None
+        self.inference_interval = 0.0
         self.fps = 30  
         
-    def get_box_color(self, cls_id):
+    @staticmethod
+    def get_box_color(cls_id):
         return (0, 0, 255) if cls_id == 0 else (0, 255, 0)  
     
     def update_track_state(self, track_id, cls_id, timestamp):
         """Update track state and detect cheating"""
         
-        if track_id not in self.track_states:
-            self.track_states[track_id] = {
-                'last_class': cls_id,
-                'cheating_start': None,
-                'cheating_count': 0,
-                'last_cheating_time': None,
-                'continuous_cheating_duration': 0,
-                'cheating_events': [], 
-                'screenshot_taken': False,
-                'is_cheating_now': False
-            }
-        
-        state = self.track_states[track_id]
+        state = self.track_states.get_or_create(track_id, cls_id)
         current_is_cheating = (cls_id == 0) 
         
         
-        if current_is_cheating and not state['is_cheating_now']:
+        if current_is_cheating and not state.is_cheating_now:
             
-            state['is_cheating_now'] = True
-            state['cheating_start'] = timestamp
-            state['cheating_count'] += 1
-            state['last_cheating_time'] = timestamp
+            state.is_cheating_now = True
+            state.cheating_start = timestamp
+            state.cheating_count += 1
+            state.last_cheating_time = timestamp
             
             
-            state['cheating_events'].append(timestamp)
+            state.cheating_events.add(timestamp)
             
     
             
-        elif not current_is_cheating and state['is_cheating_now']:
+        elif not current_is_cheating and state.is_cheating_now:
            
-            if state['cheating_start']:
-                duration = timestamp - state['cheating_start']
-                state['continuous_cheating_duration'] = duration
+            if state.cheating_start:
+                duration = timestamp - state.cheating_start
+                state.continuous_cheating_duration = duration
    
             
-            state['is_cheating_now'] = False
-            state['cheating_start'] = None
+            state.is_cheating_now = False
+            state.cheating_start = None
         
-        elif current_is_cheating and state['is_cheating_now']:
+        elif current_is_cheating and state.is_cheating_now:
             
-            if state['cheating_start']:
-                state['continuous_cheating_duration'] = timestamp - state['cheating_start']
+            if state.cheating_start:
+                state.continuous_cheating_duration = timestamp - state.cheating_start
         
        
-        state['cheating_events'] = [event for event in state['cheating_events'] 
-                                   if timestamp - event <= 10.0]
+        state.cheating_events.expire(timestamp)
         
         
-        state['last_class'] = cls_id
+        state.last_class = cls_id
         
         return self.check_cheating_rules(track_id, timestamp)
     
@@ -93,33 +101,33 @@ class CheatDetector:
         state = self.track_states[track_id]
         
         
-        if state['screenshot_taken']:
+        if state.screenshot_taken:
             return False, None
         
        
-        recent_events = len(state['cheating_events'])
+        recent_events = len(state.cheating_events)
         
        
-        continuous_duration = state['continuous_cheating_duration']
+        continuous_duration = state.continuous_cheating_duration
         
         reason = None
         
         if recent_events > 3:
             reason = f"Looked around {recent_events} times in 10 seconds"
             print(f"🚨 Alert! Track {track_id}: {reason}")
-            state['screenshot_taken'] = True
+            state.screenshot_taken = True
             return True, reason
         
         if continuous_duration >= 3.0:
             reason = f"Continuous looking around for {continuous_duration:.1f} seconds"
             print(f"🚨 Alert! Track {track_id}: {reason}")
-            state['screenshot_taken'] = True
+            state.screenshot_taken = True
             return True, reason
         
         return False, None
     
     def take_screenshot(self, frame, x1, y1, x2, y2, track_id, timestamp, reason):
-        """Take screenshot of person looking around"""
+        """Crop the person looking around; the evidence writer puts it on disk off the frame loop"""
         
        
         padding = 20
@@ -130,7 +138,8 @@ class CheatDetector:
         x2_expanded = min(width, x2 + padding)
         y2_expanded = min(height, y2 + padding)
         
-        person_crop = frame[y1_expanded:y2_expanded, x1_expanded:x2_expanded]
+        # Copy the crop so overlays drawn on the frame later don't end up in the evidence
+        person_crop = frame[y1_expanded:y2_expanded, x1_expanded:x2_expanded].copy()
         
         
         timestamp_str = datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S_%f")[:-3]  
@@ -138,115 +147,188 @@ class CheatDetector:
         filepath = os.path.join(self.screenshots_dir, filename)
         
         
-        cv2.imwrite(filepath, person_crop)
-        print(f"📸 Screenshot saved: {filename}")
-        
-        
         return {
             'filepath': filepath,
             'track_id': track_id,
             'timestamp': timestamp,
             'reason': reason,
-            'crop': person_crop
+            'bbox': (x1, y1, x2, y2),
+            'crop': person_crop,
+            'crop_origin': (x1_expanded, y1_expanded)
         }
     
     def cleanup_inactive_tracks(self, active_track_ids):
-        """Cleanup inactive tracks"""
-        self.track_states = {tid: state for tid, state in self.track_states.items() 
-                           if tid in active_track_ids}
-        self.current_tracks_info = {tid: info for tid, info in self.current_tracks_info.items() 
-                                  if tid in active_track_ids}
+        """Cleanup inactive tracks and return the ids the tracker lost"""
+        lost_track_ids = self.track_states.remove_inactive(active_track_ids)
+        for tid in self.current_tracks_info.keys() - active_track_ids:
+            del self.current_tracks_info[tid]
+        self.lost_track_ids |= lost_track_ids
+        return lost_track_ids
+
+    def pop_lost_tracks(self):
+        """Track ids lost since the last call, for caches keyed by track id"""
+        lost, self.lost_track_ids = self.lost_track_ids, set()
+        return lost
     
-    def process_frame(self, frame, frame_count):
-        """Process single frame and return detections and cheating alerts"""
+    def submit(self, frame, changed=None):
+        """Queue the raw frame on the shared model server and return a future for its detections"""
+        if self.region_inference is not None:
+            return self.region_inference.submit(frame, changed, conf=0.35, iou=0.5)
+        return self.inference_server.submit(frame,
+                                            imgsz=640,
+                                            conf=0.35,
+                                            iou=0.5)
+    
+    def analyze(self, frame, frame_count, results=None, timestamp=None):
+        """Track detections on the raw frame and return track info and cheating alerts without drawing"""
         
         
-        current_timestamp = frame_count / 30.0  
+        current_timestamp = timestamp if timestamp is not None else frame_count / self.fps
         
-       
-        original_frame = frame.copy()
+        if results is None:
+            results = self.submit(frame).result()
         
+        cheating_alerts = []
+        tracks_info = []
         
-        results = self.objectModel(frame, 
-                                 verbose=False, 
-                                 imgsz=640,
-                                 conf=0.35,
-                                 iou=0.5)[0]
+        boxes, confs, classes = results
+        valid = confs >= 0.40
         
-        detections = []
-        detection_classes = {}
-        cheating_alerts = []
+        # (N, 6) array: x1, y1, x2, y2, conf, cls — the tracker keeps each row's index as det_ind
+        detections = np.column_stack([boxes[valid].astype(int),
+                                      confs[valid],
+                                      classes[valid]]).astype(np.float32)
+
+        # Interval between real inferences; predicted frames never extrapolate further than this
+        if self.last_analyzed is not None and current_timestamp > self.last_analyzed:
+            self.inference_interval = current_timestamp - self.last_analyzed
+        self.last_analyzed = current_timestamp
+
+        # The tracker also sees frames without detections, so tracks it drops are cleaned up here
+        # instead of being carried on (and predicted from) indefinitely
+        tracks = self.tracker.update(detections if len(detections) else np.empty((0, 6), dtype=np.float32), frame)
+        
+        active_track_ids = set()
+        
+        if len(tracks):
+            track_boxes = tracks[:, :4].astype(int)
+            # boxmot returns x1, y1, x2, y2, id, conf, cls, det_ind; fall back to IoU when det_ind is missing
+            det_indices = tracks[:, 7] if tracks.shape[1] > 7 else None
+            track_classes = assign_track_classes(track_boxes, detections[:, :4],
+                                                 detections[:, 5], det_indices)
+        else:
+            track_boxes = np.zeros((0, 4), dtype=int)
+            track_classes = np.zeros(0, dtype=int)
+        
+        for track, (x1, y1, x2, y2), current_cls_id in zip(tracks, track_boxes.tolist(), track_classes.tolist()):
+            track_id = int(track[4])
+            active_track_ids.add(track_id)
+            current_label = "Looking Around" if current_cls_id == 0 else "Normal"
+        
+            # Velocity (px/s) from the previous real detection, used to predict boxes on skipped frames
+            velocity = (0.0, 0.0)
+            previous = self.current_tracks_info.get(track_id)
+            if previous is not None and current_timestamp > previous['timestamp']:
+                dt = current_timestamp - previous['timestamp']
+                px1, py1, px2, py2 = previous['bbox']
+                velocity = (((x1 + x2) - (px1 + px2)) / (2 * dt),
+                            ((y1 + y2) - (py1 + py2)) / (2 * dt))
+        
+            self.current_tracks_info[track_id] = {
+                'cls_id': current_cls_id,
+                'label': current_label,
+                'bbox': (x1, y1, x2, y2),
+                'velocity': velocity,
+                'timestamp': current_timestamp
+            }
+            tracks_info.append({
+                'track_id': track_id,
+                'cls_id': current_cls_id,
+                'label': current_label,
+                'bbox': (x1, y1, x2, y2)
+            })
         
-       
-        if results.boxes is not None:
-            boxes = results.boxes.xyxy.cpu().numpy()
-            confs = results.boxes.conf.cpu().numpy()
-            classes = results.boxes.cls.cpu().numpy().astype(int)
+            should_screenshot, reason = self.update_track_state(track_id, current_cls_id, current_timestamp)
+        
+        
+            if should_screenshot:
+                alert_info = self.take_screenshot(frame, x1, y1, x2, y2, track_id, current_timestamp, reason)
+                cheating_alerts.append(alert_info)
+        
+        
+        self.cleanup_inactive_tracks(active_track_ids)
+        
+        return tracks_info, cheating_alerts
+    
+    def predict_tracks(self, frame, frame_count, timestamp=None):
+        """Move the last known tracks forward without running the model, keeping rule timers on real time"""
+        
+        current_timestamp = timestamp if timestamp is not None else frame_count / self.fps
+        height, width = frame.shape[:2]
+        
+        cheating_alerts = []
+        tracks_info = []
+        
+        for track_id, info in self.current_tracks_info.items():
+            dt = min(current_timestamp - info['timestamp'], self.inference_interval)
+            dx = int(info['velocity'][0] * dt)
+            dy = int(info['velocity'][1] * dt)
+            x1, y1, x2, y2 = info['bbox']
+            x1, x2 = min(width, max(0, x1 + dx)), min(width, max(0, x2 + dx))
+            y1, y2 = min(height, max(0, y1 + dy)), min(height, max(0, y2 + dy))
+            x2, y2 = max(x1, x2), max(y1, y2)
             
-            valid_indices = confs >= 0.40
+            tracks_info.append({
+                'track_id': track_id,
+                'cls_id': info['cls_id'],
+                'label': info['label'],
+                'bbox': (x1, y1, x2, y2)
+            })
             
-            for i, (box, conf, cls_id) in enumerate(zip(boxes[valid_indices], 
-                                                       confs[valid_indices], 
-                                                       classes[valid_indices])):
-                x1, y1, x2, y2 = map(int, box)
-                label = "Looking Around" if cls_id == 0 else "Normal"
-                
-                detections.append([x1, y1, x2, y2, conf, cls_id])
-                detection_classes[i] = {'cls_id': cls_id, 'label': label, 'conf': conf}
-
-        if detections:
-            tracks = self.tracker.update(np.array(detections), frame)
+            # A prediction may only carry on a looking-around run that a real detection started, and no
+            # further than one inference interval past that detection
+            state = self.track_states.states.get(track_id)
+            if info['cls_id'] == 0 and (state is None or not state.is_cheating_now):
+                continue
+            should_screenshot, reason = self.update_track_state(track_id, info['cls_id'],
+                                                                info['timestamp'] + dt)
             
-            active_track_ids = set()
+            if should_screenshot:
+                alert_info = self.take_screenshot(frame, x1, y1, x2, y2, track_id, current_timestamp, reason)
+                cheating_alerts.append(alert_info)
+        
+        return tracks_info, cheating_alerts
+    
+    def motion_level(self):
+        """Fastest track speed in box heights per second"""
+        motion = 0.0
+        for info in self.current_tracks_info.values():
+            x1, y1, x2, y2 = info['bbox']
+            speed = np.hypot(*info['velocity']) / max(1, y2 - y1)
+            motion = max(motion, speed)
+        return motion
+    
+    @staticmethod
+    def draw_tracks(frame, tracks_info):
+        """Draw track boxes and labels on the frame"""
+        for info in tracks_info:
+            x1, y1, x2, y2 = info['bbox']
             
-            for track in tracks:
-                x1, y1, x2, y2 = map(int, track[:4])
-                track_id = int(track[4])
-                active_track_ids.add(track_id)
-                
-                
-                current_cls_id = 1  
-                current_label = "Normal"
-                
-                if detections:
-                    track_center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
-                    det_centers = np.array([[(d[0] + d[2]) / 2, (d[1] + d[3]) / 2] 
-                                          for d in detections])
-                    distances = np.linalg.norm(det_centers - track_center, axis=1)
-                    best_match = np.argmin(distances)
-                    
-                    if best_match < len(detection_classes) and best_match in detection_classes:
-                        current_cls_id = detection_classes[best_match]['cls_id']
-                        current_label = detection_classes[best_match]['label']
-                
-                self.current_tracks_info[track_id] = {
-                    'cls_id': current_cls_id,
-                    'label': current_label,
-                    'bbox': (x1, y1, x2, y2)
-                }
-                
-                should_screenshot, reason = self.update_track_state(track_id, current_cls_id, current_timestamp)
-                
-               
-                if should_screenshot:
-                    alert_info = self.take_screenshot(original_frame, x1, y1, x2, y2, track_id, current_timestamp, reason)
-                    cheating_alerts.append(alert_info)
-                
-               
-                box_color = self.get_box_color(current_cls_id)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, 2)
-                
-                display_text = f"{current_label} ID:{track_id}"
-                
-               
-                cv2.rectangle(frame, (x1, y1-20), (x1+120, y1), box_color, -1)
-                cv2.putText(frame, display_text, (x1, y1-5), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            box_color = CheatDetector.get_box_color(info['cls_id'])
+            cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, 2)
             
+            display_text = f"{info['label']} ID:{info['track_id']}"
             
-            self.cleanup_inactive_tracks(active_track_ids)
-        
-        return frame, cheating_alerts
+           
+            cv2.rectangle(frame, (x1, y1-20), (x1+120, y1), box_color, -1)
+            cv2.putText(frame, display_text, (x1, y1-5), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return frame
+    
+    def process_frame(self, frame, frame_count, timestamp=None):
+        """Process single frame and return detections and cheating alerts"""
+        tracks_info, cheating_alerts = self.analyze(frame, frame_count, timestamp=timestamp)
+        return self.draw_tracks(frame, tracks_info), cheating_alerts
     
     def get_final_report(self):
         """Get final statistics report"""
@@ -254,9 +336,9 @@ class CheatDetector:
         for track_id, state in self.track_states.items():
             report.append({
                 'track_id': track_id,
-                'cheating_count': state['cheating_count'],
-                'max_continuous_duration': state['continuous_cheating_duration'],
-                'screenshot_taken': state['screenshot_taken']
+                'cheating_count': state.cheating_count,
+                'max_continuous_duration': state.continuous_cheating_duration,
+                'screenshot_taken': state.screenshot_taken
             })
         return report
 
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two (N, 4) and (M, 4) xyxy box arrays"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def nms(boxes, scores, iou_threshold=0.5):
+    """Indices of the boxes kept by greedy non-maximum suppression, best score first"""
+    order = np.argsort(-np.asarray(scores))
+    iou = box_iou(boxes, boxes)
+
+    keep = []
+    suppressed = np.zeros(len(order), dtype=bool)
+    for idx in order:
+        if suppressed[idx]:
+            continue
+        keep.append(idx)
+        suppressed |= iou[idx] > iou_threshold
+    return np.array(keep, dtype=int)
+
+
+def assign_track_classes(track_boxes, det_boxes, det_classes, det_indices=None, default_cls=1, min_iou=0.1):
+    """Class of every track at once: from the tracker's detection index when given, else from the best-IoU detection"""
+    track_count = len(track_boxes)
+    classes = np.full(track_count, default_cls, dtype=int)
+    if track_count == 0 or len(det_boxes) == 0:
+        return classes
+
+    det_classes = np.asarray(det_classes, dtype=int)
+
+    if det_indices is not None:
+        det_indices = np.asarray(det_indices, dtype=int)
+        valid = (det_indices >= 0) & (det_indices < len(det_classes))
+        classes[valid] = det_classes[det_indices[valid]]
+        return classes
+
+    iou = box_iou(track_boxes, det_boxes)
+    best = iou.argmax(axis=1)
+    matched = iou[np.arange(track_count), best] >= min_iou
+    classes[matched] = det_classes[best[matched]]
+    return classes
@@ -0,0 +1,68 @@
+import math
+
+
+class FrameStrideController:
+    """Decide every how many frames the detector runs; the tracker fills the frames in between"""
+
+    def __init__(self, target_fps=15, min_stride=1, max_stride=6, max_drift=0.15, smoothing=0.2):
+        self.target_fps = target_fps
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        # Largest movement (as a fraction of box height) we accept before the next real detection
+        self.max_drift = max_drift
+        self.smoothing = smoothing
+
+        self.stride = min_stride
+        self.latency = None
+        self.frame_interval = None
+        self.last_detect_frame = None
+        self.last_frame_time = None
+
+        self.detected_frames = 0
+        self.predicted_frames = 0
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get('enabled', True):
+            return cls(min_stride=1, max_stride=1)
+        return cls(
+            target_fps=config.get('target_fps', 15),
+            min_stride=config.get('min_stride', 1),
+            max_stride=config.get('max_stride', 6),
+            max_drift=config.get('max_drift', 0.15),
+        )
+
+    def _ema(self, previous, value):
+        if previous is None:
+            return value
+        return (1 - self.smoothing) * previous + self.smoothing * value
+
+    def should_detect(self, frame_count, timestamp):
+        """True when this frame needs a full detector pass"""
+        if self.last_frame_time is not None and timestamp > self.last_frame_time:
+            self.frame_interval = self._ema(self.frame_interval, timestamp - self.last_frame_time)
+        self.last_frame_time = timestamp
+
+        if self.last_detect_frame is None or frame_count - self.last_detect_frame >= self.stride:
+            self.last_detect_frame = frame_count
+            self.detected_frames += 1
+            return True
+
+        self.predicted_frames += 1
+        return False
+
+    def update(self, latency, motion):
+        """Re-plan the stride from the last detector latency and the scene motion (box heights per second)"""
+        self.latency = self._ema(self.latency, latency)
+
+        # Frames that arrive while one detector pass runs: striding less than this only builds a backlog
+        budget_stride = math.ceil(self.latency * self.target_fps)
+
+        # Frames we can predict before the fastest student drifts too far from the last real box
+        motion_stride = self.max_stride
+        if motion > 0 and self.frame_interval:
+            motion_stride = int(self.max_drift / (motion * self.frame_interval))
+
+        stride = max(budget_stride, min(self.max_stride, motion_stride))
+        self.stride = max(self.min_stride, min(self.max_stride, stride))
+        return self.stride
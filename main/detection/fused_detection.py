@@ -0,0 +1,153 @@
+import time
+
+from django.conf import settings
+
+from main.detection.Cheating_detection import CheatDetector
+from main.detection.frame_stride import FrameStrideController
+from main.detection.motion_gate import MotionGate
+from main.detection.phone_detection import (
+    submit_mobile_detection,
+    filter_mobile_detections,
+    draw_mobile_detections,
+)
+
+
+def draw_record(frame, record):
+    """Draw every overlay of a detection record; needs no models, so a process that only streams can draw too"""
+    CheatDetector.draw_tracks(frame, record['tracks'])
+    draw_mobile_detections(frame, record['phones'])
+    return frame
+
+
+def render_record(frame, record):
+    """Annotated copy for viewers; the frame itself stays untouched"""
+    return draw_record(frame.copy(), record)
+
+
+def overlay_record(record):
+    """What drawing a record needs, without the alert crops: small enough to send to another process"""
+    return {
+        'frame_count': record['frame_count'],
+        'timestamp': record['timestamp'],
+        'tracks': record['tracks'],
+        'alerts': [{key: alert[key] for key in ('track_id', 'timestamp', 'reason', 'bbox')}
+                   for alert in record['alerts']],
+        'phones': record['phones'],
+        'predicted': record['predicted'],
+    }
+
+
+class FusedDetectionStage:
+    """Run the looking-around and phone models on the same raw frame in one scheduled pass"""
+
+    def __init__(self, cheat_detector, phone_server, camera_id=None, stride=None, motion_gate=None):
+        self.cheat_detector = cheat_detector
+        self.phone_server = phone_server
+        self.stride = stride or FrameStrideController.from_config(getattr(settings, "FRAME_STRIDE", {}))
+        self.motion_gate = motion_gate or self.build_motion_gate(camera_id)
+        self.last_latency = 0.0
+        self.last_results = None
+        self.last_phones = []
+
+    @staticmethod
+    def build_motion_gate(camera_id):
+        """Motion gate with the default thresholds overridden by the camera's own entry, if any"""
+        config = getattr(settings, "MOTION_GATE", {})
+        if not config.get('enabled', True):
+            return None
+        camera_config = dict(config.get('default', {}))
+        camera_config.update(config.get('cameras', {}).get(camera_id, {}))
+        return MotionGate.from_config(camera_config)
+
+    def run(self, frame, frame_count, timestamp=None):
+        """Send the raw frame to both model servers at once and merge their output into one record"""
+        if timestamp is None:
+            timestamp = frame_count / self.cheat_detector.fps
+
+        if self.motion_gate is not None:
+            self.motion_gate.update(frame)
+
+        if not self.stride.should_detect(frame_count, timestamp):
+            # Skipped frame: tracks move on their last velocity and the last phone boxes are held for drawing;
+            # only a frame the phone model ran on reports a detection, so one phone isn't recorded every frame
+            tracks, alerts = self.cheat_detector.predict_tracks(frame, frame_count, timestamp)
+            return {
+                'frame_count': frame_count,
+                'timestamp': timestamp,
+                'tracks': tracks,
+                'alerts': alerts,
+                'phones': self.last_phones,
+                'mobile_detected': False,
+                'latency': 0.0,
+                'predicted': True,
+            }
+
+        if (self.last_results is not None and self.motion_gate is not None
+                and not self.motion_gate.should_infer(timestamp)):
+            # Nothing moved since the last inference: feed the cached detections to the tracker; the phone
+            # that was already reported stays drawn but isn't reported again
+            tracks, alerts = self.cheat_detector.analyze(frame, frame_count, self.last_results, timestamp)
+            return {
+                'frame_count': frame_count,
+                'timestamp': timestamp,
+                'tracks': tracks,
+                'alerts': alerts,
+                'phones': self.last_phones,
+                'mobile_detected': False,
+                'latency': 0.0,
+                'predicted': True,
+            }
+
+        started = time.perf_counter()
+
+        # Both futures are served concurrently by each model's own inference worker
+        changed = None
+        if self.motion_gate is not None:
+            # Seat regions that stayed still keep their cached crop detections
+            changed = lambda box: self.motion_gate.region_changed(box, frame.shape)
+        cheat_future = self.cheat_detector.submit(frame, changed)
+        phone_future = submit_mobile_detection(frame, self.phone_server)
+
+        results = cheat_future.result()
+        tracks, alerts = self.cheat_detector.analyze(frame, frame_count, results, timestamp)
+        phones = filter_mobile_detections(phone_future.result())
+
+        self.last_latency = time.perf_counter() - started
+        self.last_results = results
+        self.last_phones = phones
+        self.stride.update(self.last_latency, self.cheat_detector.motion_level())
+        if self.motion_gate is not None:
+            self.motion_gate.mark_inferred(timestamp)
+
+        return {
+            'frame_count': frame_count,
+            'timestamp': timestamp,
+            'tracks': tracks,
+            'alerts': alerts,
+            'phones': phones,
+            'mobile_detected': bool(phones),
+            'latency': self.last_latency,
+            'predicted': False,
+        }
+
+    def stats(self):
+        """Counters for how many frames ran the models, were predicted, or reused cached detections"""
+        stats = {
+            'detected_frames': self.stride.detected_frames,
+            'predicted_frames': self.stride.predicted_frames,
+            'stride': self.stride.stride,
+        }
+        if self.motion_gate is not None:
+            stats.update({f'motion_{key}': value for key, value in self.motion_gate.stats().items()})
+        regions = self.cheat_detector.region_inference
+        if regions is not None and regions.frame_pixels:
+            stats['roi_pixel_ratio'] = regions.pixels_processed / regions.frame_pixels
+        return stats
+
+    def draw(self, frame, record):
+        """Draw every overlay from a detection record once all models are done with the frame"""
+        return draw_record(frame, record)
+
+    def render(self, frame, record):
+        """Annotated copy for viewers; the detection frame itself stays untouched"""
+        return render_record(frame, record)
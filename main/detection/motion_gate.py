@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap frame differencing against a downscaled running background to skip model calls on still scenes"""
+
+    def __init__(self, width=160, grid=(4, 4), alpha=0.05, pixel_threshold=18,
+                 region_threshold=0.01, max_skip_seconds=5.0):
+        self.width = width
+        self.grid = grid
+        self.alpha = alpha
+        # Grey-level change that counts a pixel as moving
+        self.pixel_threshold = pixel_threshold
+        # Fraction of moving pixels that marks a region as changed
+        self.region_threshold = region_threshold
+        # Cached detections are never reused for longer than this
+        self.max_skip_seconds = max_skip_seconds
+
+        self.background = None
+        self.region_energy = np.zeros(grid, dtype=np.float32)
+        self.pending_regions = np.ones(grid, dtype=bool)
+        self.last_inference_time = None
+
+        self.inferred = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            width=config.get('width', 160),
+            grid=tuple(config.get('grid', (4, 4))),
+            alpha=config.get('alpha', 0.05),
+            pixel_threshold=config.get('pixel_threshold', 18),
+            region_threshold=config.get('region_threshold', 0.01),
+            max_skip_seconds=config.get('max_skip_seconds', 5.0),
+        )
+
+    def update(self, frame):
+        """Fold a frame into the background and return the per-region motion energy"""
+        height, width = frame.shape[:2]
+        small_height = max(1, int(height * self.width / width))
+        small = cv2.resize(frame, (self.width, small_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.pending_regions[:] = True
+            return self.region_energy
+
+        moving = cv2.absdiff(gray, cv2.convertScaleAbs(self.background)) > self.pixel_threshold
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+
+        # Mean of the moving mask inside each grid cell
+        rows, cols = self.grid
+        cell_h, cell_w = moving.shape[0] // rows, moving.shape[1] // cols
+        cells = moving[:cell_h * rows, :cell_w * cols].reshape(rows, cell_h, cols, cell_w)
+        self.region_energy = cells.mean(axis=(1, 3), dtype=np.float32)
+
+        # Motion seen on frames the detector skipped still has to trigger the next inference
+        self.pending_regions |= self.region_energy > self.region_threshold
+        return self.region_energy
+
+    def region_changed(self, bbox, frame_shape):
+        """True when any grid region overlapping bbox moved since the last inference"""
+        height, width = frame_shape[:2]
+        rows, cols = self.grid
+        x1, y1, x2, y2 = bbox
+        c1 = min(cols - 1, max(0, int(x1 * cols / width)))
+        c2 = min(cols - 1, max(0, int((x2 - 1) * cols / width)))
+        r1 = min(rows - 1, max(0, int(y1 * rows / height)))
+        r2 = min(rows - 1, max(0, int((y2 - 1) * rows / height)))
+        return bool(self.pending_regions[r1:r2 + 1, c1:c2 + 1].any())
+
+    def should_infer(self, timestamp):
+        """Decide whether the models must run, or the cached detections can be reused"""
+        stale = (self.last_inference_time is None
+                 or timestamp - self.last_inference_time >= self.max_skip_seconds)
+
+        if stale or self.pending_regions.any():
+            self.inferred += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def mark_inferred(self, timestamp):
+        self.last_inference_time = timestamp
+        self.pending_regions[:] = False
+
+    def stats(self):
+        total = self.inferred + self.skipped
+        return {
+            'inferred': self.inferred,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / total if total else 0.0,
+        }
@@ -1,35 +1,36 @@
 import cv2
-import torch
-from ultralytics import YOLO
+# Trained YOLO model, served by the shared inference server acquired from the model registry
+PHONE_MODEL_PATH = "main/modelss/phone.pt"  # تأكد من وجود الملف في نفس المسار
 
-# Load trained YOLO model
-model = YOLO("main/modelss/phone.pt")  # تأكد من وجود الملف في نفس المسار
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model.to(device)
 
-def process_mobile_detection(frame):
+def submit_mobile_detection(frame, server):
+    """Queue the frame on the phone model server and return a future for its detections"""
+    return server.submit(frame)
 
-    results = model(frame, verbose=False)
-    mobile_detected = False
 
-    for result in results:
-        for box in result.boxes:
-            conf = box.conf[0].item()  # Confidence score
-            cls = int(box.cls[0].item())  # Class index
+def filter_mobile_detections(results):
+    """Keep confident mobile boxes as (x1, y1, x2, y2, conf) tuples"""
+    phones = []
+    boxes, confs, classes = results
 
-            # Skip if confidence low or not mobile class (assuming class 0 is mobile)
-            if conf < 0.8 or cls != 0:
-                continue
+    for box, conf, cls in zip(boxes, confs, classes):
+        # Skip if confidence low or not mobile class (assuming class 0 is mobile)
+        if conf < 0.8 or cls != 0:
+            continue
 
-            # Get bounding box coordinates
-            x1, y1, x2, y2 = map(int, box.xyxy[0])  
-            label = f"Mobile ({conf:.2f})"
+        x1, y1, x2, y2 = map(int, box)
+        phones.append((x1, y1, x2, y2, float(conf)))
 
-            # Draw rectangle and label
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-            cv2.putText(frame, label, (x1, y1 - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return phones
 
-            mobile_detected = True
-    
-    return frame, mobile_detected
\ No newline at end of file
+
+def draw_mobile_detections(frame, phones):
+    for x1, y1, x2, y2, conf in phones:
+        label = f"Mobile ({conf:.2f})"
+
+        # Draw rectangle and label
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+        cv2.putText(frame, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+    return frame
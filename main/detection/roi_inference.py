@@ -0,0 +1,104 @@
+import numpy as np
+
+from main.detection.box_utils import nms
+from main.integrated_modules.inference_server import Detections, empty_detections
+
+
+def regions_to_pixels(regions, frame_shape):
+    """Turn normalized [x1, y1, x2, y2] seat regions into clipped pixel boxes"""
+    height, width = frame_shape[:2]
+    boxes = []
+    for x1, y1, x2, y2 in regions:
+        box = (max(0, int(x1 * width)), max(0, int(y1 * height)),
+               min(width, int(x2 * width)), min(height, int(y2 * height)))
+        if box[2] - box[0] > 1 and box[3] - box[1] > 1:
+            boxes.append(box)
+    return boxes
+
+
+def union_region(boxes):
+    """Smallest box that covers every seat region"""
+    boxes = np.array(boxes)
+    return (int(boxes[:, 0].min()), int(boxes[:, 1].min()),
+            int(boxes[:, 2].max()), int(boxes[:, 3].max()))
+
+
+class RegionResults:
+    """Pending crop results for one frame, merged back into full-frame Detections on result()"""
+
+    def __init__(self, owner, pending, iou_threshold):
+        self.owner = owner
+        self.pending = pending
+        self.iou_threshold = iou_threshold
+
+    def result(self):
+        boxes, confs, classes = [], [], []
+        for region, source in self.pending:
+            detections = source.result() if hasattr(source, 'result') else source
+            self.owner.cache[region] = detections
+
+            # Crop results come back in crop coordinates; shift them back onto the frame
+            x1, y1 = region[0], region[1]
+            boxes.append(detections.boxes + np.array([x1, y1, x1, y1], dtype=np.float32))
+            confs.append(detections.confs)
+            classes.append(detections.classes)
+
+        if not boxes:
+            return empty_detections()
+
+        boxes = np.concatenate(boxes)
+        confs = np.concatenate(confs)
+        classes = np.concatenate(classes)
+        if len(boxes) == 0:
+            return empty_detections()
+
+        # Students sitting where two regions overlap are detected twice; keep the best box per class
+        offsets = classes[:, None].astype(np.float32) * 100000.0
+        keep = nms(boxes + offsets, confs, self.iou_threshold)
+        return Detections(boxes[keep], confs[keep], classes[keep])
+
+
+class SeatRegionInference:
+    """Run the detector on batched seat-region crops (or their tight union) instead of the whole frame"""
+
+    def __init__(self, server, regions, mode="crops", min_imgsz=320, max_imgsz=640, iou_threshold=0.5):
+        self.server = server
+        self.regions = regions
+        self.mode = mode
+        self.min_imgsz = min_imgsz
+        self.max_imgsz = max_imgsz
+        self.iou_threshold = iou_threshold
+
+        # Last detections per region box, reused for regions the motion gate reports as still
+        self.cache = {}
+        self.pixels_processed = 0
+        self.frame_pixels = 0
+
+    def crop_imgsz(self, box):
+        """Inference size close to the crop's native resolution, bucketed so crops still batch together"""
+        long_side = max(box[2] - box[0], box[3] - box[1])
+        size = self.min_imgsz
+        while size < long_side and size < self.max_imgsz:
+            size += 160
+        return min(size, self.max_imgsz)
+
+    def submit(self, frame, changed=None, **kwargs):
+        """Queue the crops of one frame; regions for which changed(box) is False reuse cached detections"""
+        boxes = regions_to_pixels(self.regions, frame.shape)
+        if self.mode == "union" and boxes:
+            boxes = [union_region(boxes)]
+
+        self.frame_pixels += frame.shape[0] * frame.shape[1]
+
+        pending = []
+        for box in boxes:
+            if changed is not None and box in self.cache and not changed(box):
+                pending.append((box, self.cache[box]))
+                continue
+
+            x1, y1, x2, y2 = box
+            crop = frame[y1:y2, x1:x2]
+            self.pixels_processed += crop.shape[0] * crop.shape[1]
+            pending.append((box, self.server.submit(crop, **dict(kwargs, imgsz=self.crop_imgsz(box)))))
+
+        return RegionResults(self, pending, self.iou_threshold)
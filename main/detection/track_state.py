@@ -0,0 +1,73 @@
+from collections import deque
+
+
+class EventWindow:
+    """Event timestamps inside a sliding time window; old events are popped from the front"""
+
+    __slots__ = ('span', 'events')
+
+    def __init__(self, span=10.0, capacity=32):
+        self.span = span
+        # Rules only care about small counts, so the ring never needs to grow past capacity
+        self.events = deque(maxlen=capacity)
+
+    def add(self, timestamp):
+        self.events.append(timestamp)
+
+    def expire(self, now):
+        events = self.events
+        while events and now - events[0] > self.span:
+            events.popleft()
+
+    def __len__(self):
+        return len(self.events)
+
+
+class TrackState:
+    """Rule bookkeeping for one tracked student"""
+
+    __slots__ = ('last_class', 'cheating_start', 'cheating_count', 'last_cheating_time',
+                 'continuous_cheating_duration', 'cheating_events', 'screenshot_taken', 'is_cheating_now')
+
+    def __init__(self, cls_id, window=10.0):
+        self.last_class = cls_id
+        self.cheating_start = None
+        self.cheating_count = 0
+        self.last_cheating_time = None
+        self.continuous_cheating_duration = 0
+        self.cheating_events = EventWindow(window)
+        self.screenshot_taken = False
+        self.is_cheating_now = False
+
+
+class TrackStateStore:
+    """Track states keyed by track id, with in-place removal of tracks the tracker dropped"""
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.states = {}
+
+    def get_or_create(self, track_id, cls_id):
+        state = self.states.get(track_id)
+        if state is None:
+            state = self.states[track_id] = TrackState(cls_id, self.window)
+        return state
+
+    def remove_inactive(self, active_track_ids):
+        """Delete only the tracks that are gone and return their ids"""
+        lost = self.states.keys() - active_track_ids
+        for track_id in lost:
+            del self.states[track_id]
+        return lost
+
+    def __getitem__(self, track_id):
+        return self.states[track_id]
+
+    def __contains__(self, track_id):
+        return track_id in self.states
+
+    def __len__(self):
+        return len(self.states)
+
+    def items(self):
+        return self.states.items()
@@ -1,4 +1,4 @@
-import cv2
+import threading
 import time
 from datetime import datetime
 import os
@@ -6,26 +6,66 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 
 from main.detection.Cheating_detection import CheatDetector
-from main.integrated_modules.face_recognition import FaceClassifier
+from main.integrated_modules.face_recognition import acquire_face_classifier, release_face_classifier
+from main.integrated_modules.inference_server import acquire_inference_server, release_inference_server
 from main.integrated_modules.database_manager import DatabaseManager
-from main.detection.phone_detection import process_mobile_detection
-from main.state import should_stop, cheating_stats
+from main.integrated_modules.evidence_writer import get_evidence_writer
+from main.integrated_modules.clip_recorder import ClipRecorder
+from main.integrated_modules.identity_cache import IdentityCache
+from main.integrated_modules.face_quality import BestFaceSelector, FaceCandidate
+from main.integrated_modules.frame_capture import FrameGrabber
+from main.detection.fused_detection import FusedDetectionStage
+from main.detection.phone_detection import PHONE_MODEL_PATH
+from main.state import should_stop, record_violation
 
 
 class IntegratedCheatingSystem:
     def __init__(self, camera, cheating_model_path, face_db_path, exam_location):
         self.camera = camera
         self.video_path = camera.stream if camera.is_live else camera.video_path
-        self.cheat_detector = CheatDetector(model_path=cheating_model_path)
+
+        # Models come from the process-wide registry; close() gives back whatever was acquired,
+        # also when the setup below fails halfway
+        self.model_paths = []
+        self.face_db_path = None
+        self.closed = False
+        try:
+            servers = []
+            for model_path in (cheating_model_path, PHONE_MODEL_PATH):
+                servers.append(acquire_inference_server(model_path))
+                self.model_paths.append(model_path)
+            self.face_classifier = acquire_face_classifier(face_db_path)
+            self.face_db_path = face_db_path
+
+            self.cheat_detector = CheatDetector(model_path=cheating_model_path,
+                                                seat_regions=camera.seat_regions,
+                                                inference_server=servers[0])
+            self.detection_stage = FusedDetectionStage(self.cheat_detector, servers[1], camera_id=camera.id)
+        except Exception:
+            self.close()
+            raise
         self.db_manager = DatabaseManager()
-        self.face_classifier = FaceClassifier(face_db_path)
+        self.evidence_writer = get_evidence_writer()
+        # None when EVIDENCE_CLIPS is disabled
+        self.clip_recorder = ClipRecorder.from_config()
+        # Clips that were dropped or failed; the lock orders that against the event row being inserted
+        self.failed_clips = set()
+        self.clip_lock = threading.Lock()
+        self.identity_cache = IdentityCache.from_config(camera.id)
+        self.face_selector = BestFaceSelector.from_config()
         self.exam_location = exam_location
         self.last_summary_time = time.time()
 
         self.cheating_results = []
         self.phone_detections = []
 
-        self.cap = cv2.VideoCapture(self.video_path)
+        # Where accepted violations go: the in-process stats, or the result channel of a worker process
+        self.publish_violation = lambda result: record_violation(self.camera.id, result)
+        # Where each frame's record goes besides the caller: a worker process sends it back for the viewers
+        self.publish_record = None
+
+        # The capture thread starts with run(); viewers that only borrow the detector don't open the source
+        self.grabber = None
 
     def format_timestamp(self, timestamp):
         minutes = int(timestamp // 60)
@@ -33,13 +73,85 @@ class IntegratedCheatingSystem:
         milliseconds = int((timestamp % 1) * 1000)
         return f"{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
 
-    def process_cheating_alert(self, alert_info):
+    def process_cheating_alerts(self, alerts):
+        """Handle all alerts of one frame; their faces are embedded together in one batch"""
+        if not alerts:
+            return []
+        cache = self.identity_cache
+        # Only tracks with no confident identity yet (or a suspected id switch) go through FaceNet;
+        # the alert's own face joins the faces collected so far and the best of them is embedded now
+        pending = [alert for alert in alerts
+                   if cache.needs_recognition(alert['track_id'], alert['bbox'], alert['timestamp'])]
+        for alert in pending:
+            self.add_face_candidate(alert['track_id'], alert['crop'], alert['crop_origin'], alert['bbox'],
+                                    alert['timestamp'])
+        fresh = self.recognize_tracks([alert['track_id'] for alert in pending])
+
+        results = []
+        for alert in alerts:
+            known = cache.get(alert['track_id'])
+            if known is not None and known.label is not None:
+                identity = (known.label, known.confidence)
+            else:
+                identity = fresh.get(alert['track_id'], ("No Face Detected", 0.0))
+            results.append(self.process_cheating_alert(alert, identity))
+        return results
+
+    def add_face_candidate(self, track_id, image, origin, bbox, timestamp):
+        # The crop is padded around the track box; only a face inside the box itself is this student's
+        ox, oy = origin
+        x1, y1, x2, y2 = bbox
+        face, quality = self.face_classifier.detect_face(image, region=(x1 - ox, y1 - oy, x2 - ox, y2 - oy))
+        if face is not None:
+            self.face_selector.add(track_id, FaceCandidate(quality, face, bbox, timestamp))
+
+    def collect_faces(self, frame, record):
+        """Score the faces of tracks that still need recognising, so an identity is ready before they alert"""
+        if record['predicted']:
+            return
+        timestamp = record['timestamp']
+        height, width = frame.shape[:2]
+        sampled = 0
+        for track in record['tracks']:
+            if sampled >= self.face_selector.max_per_frame:
+                break
+            track_id, bbox = track['track_id'], track['bbox']
+            if not self.identity_cache.needs_recognition(track_id, bbox, timestamp):
+                continue
+            if not self.face_selector.due(track_id, timestamp):
+                continue
+            x1, y1, x2, y2 = bbox
+            origin = (max(0, x1 - 20), max(0, y1 - 20))
+            crop = frame[origin[1]:min(height, y2 + 20), origin[0]:min(width, x2 + 20)]
+            if crop.size:
+                self.add_face_candidate(track_id, crop, origin, bbox, timestamp)
+                sampled += 1
+
+        self.recognize_tracks(self.face_selector.ready_tracks(timestamp))
+
+    def recognize_tracks(self, track_ids):
+        """Embed the best collected face of each track in one batch; returns {track_id: (name, confidence)}"""
+        candidates = [(track_id, self.face_selector.take(track_id)) for track_id in track_ids]
+        candidates = [(track_id, candidate) for track_id, candidate in candidates if candidate is not None]
+        identities = self.face_classifier.classify_faces([candidate.face for _, candidate in candidates])
+
+        fresh = {}
+        for (track_id, candidate), identity in zip(candidates, identities):
+            self.identity_cache.update(track_id, identity['name'], identity['confidence'],
+                                       identity['embedding'], candidate.bbox, candidate.timestamp)
+            fresh[track_id] = (identity['name'], identity['confidence'])
+        return fresh
+
+    def process_cheating_alert(self, alert_info, identity=None):
         track_id = alert_info['track_id']
         timestamp = alert_info['timestamp']
         reason = alert_info['reason']
         cropped_image = alert_info['crop']
 
-        academic_id, confidence = self.face_classifier.classify_cropped_image(cropped_image)
+        # identity: (academic_id, confidence) already recognised by a batch, otherwise classify here
+        if identity is None:
+            identity = self.face_classifier.classify_cropped_image(cropped_image)
+        academic_id, confidence = identity
         student_name = self.db_manager.get_student_name(academic_id)
 
         try:
@@ -67,7 +179,7 @@ class IntegratedCheatingSystem:
             'datetime': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        recent_alerts = cheating_stats[self.camera.id]["violations"]
+        recent_alerts = self.cheating_results[-30:]
         result_time = datetime.strptime(result["datetime"], "%Y-%m-%d %H:%M:%S")
 
         for r in recent_alerts:
@@ -77,20 +189,40 @@ class IntegratedCheatingSystem:
                     print(f"⏳ Ignoring repeated cheating alert for {academic_id} within 10 seconds")
                     return
 
-        self.cheating_results.append(result)
-        cheating_stats[self.camera.id]["count"] += 1
-        cheating_stats[self.camera.id]["violations"].insert(0, result)
-        cheating_stats[self.camera.id]["violations"] = cheating_stats[self.camera.id]["violations"][:30]
+        def clip_finished(path):
+            # Runs on the clip writer thread; None if the clip was dropped or could not be written, in which
+            # case the event row (inserted before or after this) must not keep the clip path
+            if path is None:
+                with self.clip_lock:
+                    self.failed_clips.add(clip_path)
+                    self.db_manager.clear_clip_path(clip_path)
+                result['clip_path'] = None
+
+        # The clip is cut a few seconds later, once the frames after the event have arrived
+        clip_path = None
+        if self.clip_recorder is not None:
+            clip_path = self.clip_recorder.request_clip(timestamp, alert_info['filepath'], callback=clip_finished)
+        result['clip_path'] = clip_path
+
+        def record_event(image_path):
+            # Runs on an evidence writer thread once the screenshot is on disk (None if it was dropped)
+            with self.clip_lock:
+                self.db_manager.record_cheating_event(
+                    academic_id=academic_id,
+                    timestamp=timestamp,
+                    formatted_time=self.format_timestamp(timestamp),
+                    details=reason,
+                    confidence=confidence,
+                    image_path=image_path,
+                    location=self.exam_location,
+                    clip_path=None if clip_path in self.failed_clips else clip_path
+                )
+
+        result['filepath'] = self.evidence_writer.submit(cropped_image, alert_info['filepath'],
+                                                         callback=record_event)
 
-        self.db_manager.record_cheating_event(
-            academic_id=academic_id,
-            timestamp=timestamp,
-            formatted_time=self.format_timestamp(timestamp),
-            details=reason,
-            confidence=confidence,
-            image_path=alert_info['filepath'],
-            location=self.exam_location
-        )
+        self.cheating_results.append(result)
+        self.publish_violation(result)
 
         print(f"\n🚨 Processing cheating alert for person ID: {track_id}")
         print(f"⏰ Time: {self.format_timestamp(timestamp)}")
@@ -99,8 +231,8 @@ class IntegratedCheatingSystem:
         print(f"👤 Student: {student_name}")
         print(f"🆔 Academic ID: {academic_id}")
         print(f"🎯 Recognition confidence: {confidence:.2f}")
-        print(f"💾 Image saved: {alert_info['filepath']}")
-        print(f"📝 Recorded in database with location: {self.exam_location}")
+        print(f"💾 Image queued: {result['filepath']}")
+        print(f"📝 Queued for database with location: {self.exam_location}")
         print("-" * 50)
 
         return result
@@ -135,37 +267,80 @@ class IntegratedCheatingSystem:
     def display_results_on_frame(self, frame):
         return frame  # 🛑 لا يتم عرض أي شيء على الفريم نفسه
 
-    def run(self):
-        print(f"[🚀] Detection started on camera {self.camera.id} in {self.exam_location}")
-        
-        frame_count = 0
+    def process_packet(self, packet, frame_count):
+        """Run both models on one captured frame and handle its alerts; returns the stage record for drawing"""
+        frame = packet.frame
+        timestamp = packet.timestamp
 
-        while not should_stop.get(self.camera.id, False):
-            ret, frame = self.cap.read()
-            if not ret:
-                print(f"[⛔] Failed to read frame from camera {self.camera.id}")
-                break
+        # ✅ الموديلين على نفس الفريم الخام في نفس الوقت
+        # Detection only reads the frame; alert crops are copied, nothing is drawn here
+        frame.flags.writeable = False
+        if self.clip_recorder is not None:
+            self.clip_recorder.add_frame(frame, timestamp)
+        record = self.detection_stage.run(frame, frame_count, timestamp)
+        lost_track_ids = self.cheat_detector.pop_lost_tracks()
+        self.identity_cache.expire(lost_track_ids)
+        self.face_selector.expire(lost_track_ids)
 
-            # ✅ تحليل فريم واحد فقط
-            processed_frame, cheating_alerts = self.cheat_detector.process_frame(frame, frame_count)
+        self.collect_faces(frame, record)
+        self.process_cheating_alerts(record['alerts'])
 
-            for alert in cheating_alerts:
-                self.process_cheating_alert(alert)
+        if record['mobile_detected']:
+            self.process_phone_detection(timestamp)
 
-            # ✅ كشف الهاتف من نفس الفريم
-            phone_frame, phone_detected = process_mobile_detection(processed_frame)
-            if phone_detected:
-                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-                self.process_phone_detection(timestamp)
+        if self.publish_record is not None:
+            self.publish_record(frame, record)
+        return record
 
-            frame_count += 1
-            time.sleep(0.05)
+    def run(self, source=None):
+        print(f"[🚀] Detection started on camera {self.camera.id} in {self.exam_location}")
+        
+        # source: anything with read(after_seq)/ended/release(), e.g. a shared-memory ring in a worker process
+        self.grabber = source or FrameGrabber(self.video_path, is_live=self.camera.is_live,
+                                              name=f"camera {self.camera.id}")
+        frame_count = 0
+        last_seq = 0
 
-        self.cap.release()
-        print(f"[🛑] Detection stopped for camera {self.camera.id}")
-        self.generate_final_report()
+        try:
+            while not should_stop.get(self.camera.id, False):
+                # Always the newest decoded frame; stale ones were overwritten by the capture thread
+                packet = self.grabber.read(last_seq)
+                if packet is None:
+                    if self.grabber.ended:
+                        print(f"[⛔] Failed to read frame from camera {self.camera.id}")
+                        break
+                    continue
+                last_seq = packet.seq
+
+                self.process_packet(packet, frame_count)
+                frame_count += 1
+        finally:
+            # Whatever ended the loop, the models go back to the registry
+            try:
+                self.grabber.release()
+                capture_stats = self.grabber.stats()
+                print(f"[🛑] Detection stopped for camera {self.camera.id} | "
+                      f"decoded {capture_stats['decoded']}, dropped {capture_stats['dropped']}, "
+                      f"decode {capture_stats['decode_latency_ms']:.1f} ms")
+                self.generate_final_report()
+            finally:
+                self.close()
+
+    def close(self):
+        """Give the models back to the registry; the last camera of a hall to stop unloads them"""
+        if self.closed:
+            return
+        self.closed = True
+        for model_path in self.model_paths:
+            release_inference_server(model_path)
+        if self.face_db_path is not None:
+            release_face_classifier(self.face_db_path)
 
     def generate_final_report(self):
+        # The stream is over: clips still waiting for their "after" frames are cut with what was buffered
+        if self.clip_recorder is not None:
+            self.clip_recorder.flush()
+
         report_lines = []
         report_lines.append("\n🎯 Generating comprehensive report (Database + PDF)...")
 
@@ -197,6 +372,12 @@ class IntegratedCheatingSystem:
         else:
             report_lines.append("No events recorded.")
 
+        # A quiet session is exactly when the motion gate saves the most, so this is reported either way
+        stage_stats = self.detection_stage.stats()
+        if 'motion_skipped' in stage_stats:
+            report_lines.append(f"   • Inferences skipped by motion gate: {stage_stats['motion_skipped']}"
+                                f" of {stage_stats['motion_skipped'] + stage_stats['motion_inferred']}")
+
         final_report = "\n".join(report_lines)
         print(final_report)
 
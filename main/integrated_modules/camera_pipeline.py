@@ -0,0 +1,252 @@
+import os
+import threading
+
+import cv2
+from django.conf import settings
+
+from main.detection.fused_detection import render_record
+from main.integrated_detection import IntegratedCheatingSystem
+from main.integrated_modules.frame_cache import get_frame_cache
+from main.integrated_modules.frame_capture import FrameGrabber, FramePacket
+from main.state import detectors, should_stop
+
+
+def camera_source(camera):
+    """Capture source of a camera: webcam index or stream URL when live, otherwise its recorded video"""
+    if camera.is_live and camera.stream:
+        return int(camera.stream) if camera.stream.isdigit() else camera.stream
+    if camera.video_path:
+        return os.path.join(settings.BASE_DIR, camera.video_path.replace('/', os.sep))
+    return None
+
+
+class CameraPipeline:
+    """One capture and one detection stage per camera; viewers and the background worker subscribe to its output.
+
+    The pipeline runs while it has users: 'viewer' (MJPEG streams, get annotated frames), 'feed' (worker
+    process feeders, get raw frames) and 'detector' (anti-cheating enabled for the hall). Subscribers read
+    packets with the same read(after_seq)/ended interface as FrameGrabber. When a worker process runs the
+    detection, its newest record comes back through set_remote_record() and is drawn on the viewers' frames.
+    """
+
+    def __init__(self, camera):
+        self.camera = camera
+        # Opened by the pipeline thread: a slow or dead stream URL must not hold _pipelines_lock
+        self.grabber = None
+
+        self.users = {"viewer": 0, "feed": 0, "detector": 0}
+        self.exam_location = None
+        self.detector = None
+        self.closed = False
+
+        # Latest frame for snapshot requests (latest_anti_cheat_frame); encoded only when asked for
+        self.frame_cache = get_frame_cache(camera.id)
+
+        self.condition = threading.Condition()
+        self.latest = None
+        self.record = None
+        self.remote_record = None
+        self.frames_processed = 0
+
+        self.thread = threading.Thread(target=self._loop, daemon=True, name=f"pipeline:{camera.id}")
+
+    @property
+    def ended(self):
+        return self.closed
+
+    @property
+    def detecting(self):
+        return self.users["detector"] > 0 and not should_stop.get(self.camera.id, False)
+
+    def _loop(self):
+        self.grabber = FrameGrabber(camera_source(self.camera), is_live=self.camera.is_live,
+                                    name=f"camera {self.camera.id}")
+        try:
+            self._process_frames()
+        finally:
+            # Also on an unexpected error: the detector gives its models back and the camera is freed
+            with _pipelines_lock:
+                if not self.closed:
+                    self._close()
+            if self.detector is not None:
+                self._finish_detection()
+            self.grabber.release()
+
+    def _process_frames(self):
+        cam_id = self.camera.id
+        frame_count = 0
+        last_seq = 0
+
+        while True:
+            with _pipelines_lock:
+                if not any(self.users.values()):
+                    self._close()
+                    break
+
+            packet = self.grabber.read(last_seq)
+            if packet is None:
+                if self.grabber.ended:
+                    print(f"[⚠️] لم يتم قراءة الفريم من الكاميرا {cam_id}")
+                    with _pipelines_lock:
+                        self._close()
+                    break
+                continue
+            last_seq = packet.seq
+            frame = packet.frame
+            frame.flags.writeable = False
+
+            record = None
+            if self.detecting:
+                if self.detector is None:
+                    self.detector = IntegratedCheatingSystem(
+                        camera=self.camera,
+                        cheating_model_path="main/modelss/best.pt",
+                        face_db_path="main/modelss/face_db_clean.npz",
+                        exam_location=self.exam_location,
+                    )
+                    detectors[cam_id] = self.detector
+                    print(f"[🚀] Detection started on camera {cam_id} in {self.exam_location}")
+
+                try:
+                    record = self.detector.process_packet(packet, frame_count)
+                except Exception as e:
+                    print(f"[❌] خطأ أثناء تحليل الفريم: {e}")
+                frame_count += 1
+            elif self.detector is not None:
+                self._finish_detection()
+                frame_count = 0
+
+            # Detection in a worker process: its newest record, a few frames behind by the inference latency
+            overlay, render = record, None
+            if record is not None:
+                render = self.detector.detection_stage.render
+            elif self.users["feed"]:
+                overlay, render = self.remote_record, render_record
+
+            # Overlays are drawn only when someone is watching, and on a copy
+            display = frame
+            if self.users["viewer"]:
+                if overlay is not None:
+                    display = render(frame, overlay)
+                    if record is not None:
+                        display = self.detector.display_results_on_frame(display)
+                else:
+                    banner = "Anti-Cheating Starting..." if self.users["feed"] else "Anti-Cheating Disabled"
+                    display = cv2.putText(frame.copy(), banner, (30, 30),
+                                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+            # Nobody watching: the snapshot cache draws the overlays itself if the frame is ever requested
+            if overlay is not None and display is frame:
+                self.frame_cache.update(frame, overlay, render)
+            else:
+                self.frame_cache.update(display)
+            if record is not None and record['alerts']:
+                self.frame_cache.update(frame, record, self.detector.detection_stage.render, kind="alert")
+
+            with self.condition:
+                self.latest = FramePacket(packet.seq, display, packet.timestamp, packet.captured_at)
+                self.record = overlay
+                self.frames_processed += 1
+                self.condition.notify_all()
+
+    def set_remote_record(self, record, frame=None):
+        """Newest detection record of the worker process running this camera; None once it stopped.
+
+        An alert record comes with the worker's own frame and becomes the camera's alert snapshot.
+        """
+        self.remote_record = record
+        if record is not None and frame is not None and record['alerts']:
+            self.frame_cache.update(frame, record, render_record, kind="alert")
+
+    def _finish_detection(self):
+        detector = self.detector
+        self.detector = None
+        if detectors.get(self.camera.id) is detector:
+            del detectors[self.camera.id]
+
+        capture_stats = self.grabber.stats()
+        print(f"[🛑] Detection stopped for camera {self.camera.id} | "
+              f"decoded {capture_stats['decoded']}, dropped {capture_stats['dropped']}, "
+              f"decode {capture_stats['decode_latency_ms']:.1f} ms")
+        try:
+            detector.generate_final_report()
+        except Exception as e:
+            print(f"[⚠️] فشل توليد التقرير النهائي: {e}")
+        finally:
+            detector.close()
+
+    def _close(self):
+        # Called with _pipelines_lock held
+        self.closed = True
+        if _pipelines.get(self.camera.id) is self:
+            del _pipelines[self.camera.id]
+        with self.condition:
+            self.condition.notify_all()
+
+    def read(self, after_seq=0, timeout=2.0):
+        """Newest output packet with seq > after_seq, waiting up to timeout; None on timeout or once closed"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: (self.latest is not None and self.latest.seq > after_seq) or self.closed,
+                timeout,
+            )
+            packet = self.latest
+            if packet is None or packet.seq <= after_seq:
+                return None
+            return packet
+
+    def release(self, role="viewer"):
+        with _pipelines_lock:
+            self.users[role] = max(0, self.users[role] - 1)
+
+    def stats(self):
+        stats = dict(self.grabber.stats()) if self.grabber is not None else {}
+        stats.update({"processed": self.frames_processed, **self.users})
+        return stats
+
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def _acquire(camera, role):
+    # Called with _pipelines_lock held; the caller starts the thread of a new pipeline after releasing it
+    pipeline = _pipelines.get(camera.id)
+    created = pipeline is None
+    if created:
+        pipeline = _pipelines[camera.id] = CameraPipeline(camera)
+    pipeline.users[role] += 1
+    return pipeline, created
+
+
+def open_camera_pipeline(camera, role="viewer"):
+    """Pipeline of the camera with one more user of the given role, started on first use"""
+    with _pipelines_lock:
+        pipeline, created = _acquire(camera, role)
+    if created:
+        pipeline.thread.start()
+    return pipeline
+
+
+def get_camera_pipeline(cam_id):
+    return _pipelines.get(cam_id)
+
+
+def start_camera_detection(camera, exam_location):
+    """Turn detection on in the camera's pipeline; False if it was already running"""
+    with _pipelines_lock:
+        pipeline = _pipelines.get(camera.id)
+        if pipeline is not None and pipeline.users["detector"]:
+            return False
+        pipeline, created = _acquire(camera, "detector")
+        pipeline.exam_location = exam_location
+    if created:
+        pipeline.thread.start()
+    return True
+
+
+def stop_camera_detection(cam_id):
+    with _pipelines_lock:
+        pipeline = _pipelines.get(cam_id)
+        if pipeline is not None:
+            pipeline.users["detector"] = 0
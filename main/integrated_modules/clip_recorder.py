@@ -0,0 +1,198 @@
+import os
+import queue
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+def run_callback(callback, path):
+    if callback is None:
+        return
+    try:
+        callback(path)
+    except Exception as e:
+        print(f"[❌] Clip callback failed for {path}: {e}")
+
+
+class FrameHistory:
+    """Recent frames of one camera as JPEG bytes, bounded both in seconds and in total bytes"""
+
+    def __init__(self, seconds=10.0, max_bytes=32 * 1024 * 1024):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.total_bytes = 0
+
+    def add(self, timestamp, jpeg):
+        frames = self.frames
+        frames.append((timestamp, jpeg))
+        self.total_bytes += len(jpeg)
+        while frames and (self.total_bytes > self.max_bytes or timestamp - frames[0][0] > self.seconds):
+            self.total_bytes -= len(frames.popleft()[1])
+
+    def between(self, start, end):
+        return [(timestamp, jpeg) for timestamp, jpeg in self.frames if start <= timestamp <= end]
+
+
+class ClipRecorder:
+    """Keeps a camera's recent frames compressed in memory and cuts a clip around each alert.
+
+    add_frame() runs on the detection loop and samples frames at `fps`; a clip requested for an
+    alert is cut once `after` seconds of frames have arrived and written by the shared clip writer.
+    """
+
+    def __init__(self, before=5.0, after=3.0, fps=10, width=640, quality=70, max_bytes=32 * 1024 * 1024,
+                 writer=None):
+        self.before = before
+        self.after = after
+        self.fps = fps
+        self.width = width
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.history = FrameHistory(seconds=before + after + 1.0, max_bytes=max_bytes)
+        self.writer = writer or get_clip_writer()
+
+        self.last_sampled = None
+        self.pending = []
+
+    @classmethod
+    def from_config(cls):
+        config = getattr(settings, "EVIDENCE_CLIPS", {})
+        if not config.get("enabled", True):
+            return None
+        return cls(
+            before=config.get("before", 5.0),
+            after=config.get("after", 3.0),
+            fps=config.get("fps", 10),
+            width=config.get("width", 640),
+            quality=config.get("quality", 70),
+            max_bytes=config.get("max_mb", 32) * 1024 * 1024,
+        )
+
+    @staticmethod
+    def clip_path(image_path):
+        """Clip of an alert lives next to its screenshot, so the path is known before it is written"""
+        return f"{os.path.splitext(image_path)[0]}.mp4"
+
+    def add_frame(self, frame, timestamp):
+        # Small tolerance so float timestamps of a 30 fps source still sample at exactly fps
+        if self.last_sampled is None or timestamp - self.last_sampled >= 1.0 / self.fps - 1e-6:
+            self.last_sampled = timestamp
+            if self.width and frame.shape[1] > self.width:
+                height = round(frame.shape[0] * self.width / frame.shape[1])
+                frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', frame, self.encode_params)
+            if ok:
+                self.history.add(timestamp, buffer.tobytes())
+
+        while self.pending and timestamp >= self.pending[0][0] + self.after:
+            self._cut(*self.pending.pop(0))
+
+    def request_clip(self, timestamp, image_path, callback=None):
+        """Plan a clip around an alert at timestamp; returns the path it will be written to.
+
+        callback(path) runs once the clip is on disk, or callback(None) if it was dropped or failed.
+        """
+        path = self.clip_path(image_path)
+        self.pending.append((timestamp, path, callback))
+        return path
+
+    def flush(self):
+        """Cut every pending clip with the frames buffered so far (the stream is ending)"""
+        while self.pending:
+            self._cut(*self.pending.pop(0))
+
+    def _cut(self, timestamp, path, callback):
+        frames = self.history.between(timestamp - self.before, timestamp + self.after)
+        if frames:
+            # Played back at the rate the frames were really sampled, so the clip lasts as long as the event
+            span = frames[-1][0] - frames[0][0]
+            fps = (len(frames) - 1) / span if span > 0 else self.fps
+            self.writer.submit([jpeg for _, jpeg in frames], path, fps, callback)
+        else:
+            print(f"[⚠️] No buffered frames for clip {path}")
+            run_callback(callback, None)
+
+
+class ClipWriter:
+    """Background thread that decodes buffered JPEG frames and writes them out as a video file"""
+
+    def __init__(self, max_queue=16, codec="mp4v"):
+        self.codec = codec
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self._work, daemon=True, name="clip-writer")
+        self.thread.start()
+
+    def submit(self, frames, path, fps, callback=None):
+        try:
+            self.jobs.put_nowait((frames, path, fps, callback))
+        except queue.Full:
+            self.dropped += 1
+            print(f"[⚠️] Clip queue full, dropped {path}")
+            run_callback(callback, None)
+
+    def _write(self, frames, path, fps):
+        first = cv2.imdecode(np.frombuffer(frames[0], np.uint8), cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Written under a temp name and renamed, so a reviewer never opens a half-written clip
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.tmp{ext}"
+        video = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*self.codec), fps, (width, height))
+        if not video.isOpened():
+            raise IOError(f"Could not open video writer for {path}")
+        try:
+            video.write(first)
+            for jpeg in frames[1:]:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                video.write(frame)
+        finally:
+            video.release()
+        os.replace(tmp_path, path)
+
+    def _work(self):
+        while True:
+            frames, path, fps, callback = self.jobs.get()
+            try:
+                self._write(frames, path, fps)
+                self.written += 1
+                print(f"🎞️ Clip saved: {path} ({len(frames)} frames)")
+            except Exception as e:
+                self.failed += 1
+                print(f"[❌] Failed to write clip {path}: {e}")
+                path = None
+            run_callback(callback, path)
+            self.jobs.task_done()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self.jobs.qsize(),
+        }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_clip_writer():
+    """Process-wide clip writer configured from settings.EVIDENCE_CLIPS"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            config = getattr(settings, "EVIDENCE_CLIPS", {})
+            _writer = ClipWriter(max_queue=config.get("max_queue", 16), codec=config.get("codec", "mp4v"))
+        return _writer
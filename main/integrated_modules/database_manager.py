@@ -40,6 +40,11 @@ class DatabaseManager:
             )
         ''')
 
+        # clip_path: short video around the event, added after the first release
+        cursor.execute("PRAGMA table_info(cheating_events)")
+        if 'clip_path' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE cheating_events ADD COLUMN clip_path TEXT")
+
         # attendance_log table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS attendance_log (
@@ -104,7 +109,7 @@ class DatabaseManager:
         return result[0] if result else "Unknown Student"
 
     def record_cheating_event(self, academic_id, timestamp, formatted_time, details,
-                              confidence=0.0, image_path=None, location="Exam Hall"):
+                              confidence=0.0, image_path=None, location="Exam Hall", clip_path=None):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
@@ -115,10 +120,11 @@ class DatabaseManager:
 
         cursor.execute('''
             INSERT INTO cheating_events
-            (academic_id, timestamp, formatted_time, location, details, confidence, image_path, datetime_recorded)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            (academic_id, timestamp, formatted_time, location, details, confidence, image_path, clip_path,
+             datetime_recorded)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (academic_id, timestamp, formatted_time, location, details, confidence,
-              image_path, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+              image_path, clip_path, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
 
         cursor.execute('''
             UPDATE students SET cheat_count = cheat_count + 1 WHERE academic_id = ?
@@ -128,6 +134,14 @@ class DatabaseManager:
         conn.close()
         print(f"📝 Cheating recorded for {academic_id} | {details}")
 
+    def clear_clip_path(self, clip_path):
+        """The clip of an event could not be written: don't point reviewers at a missing file"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('UPDATE cheating_events SET clip_path = NULL WHERE clip_path = ?', (clip_path,))
+        conn.commit()
+        conn.close()
+
     def record_phone_detection(self, timestamp, formatted_time, location="Exam Hall"):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+# id: "<epoch>-<n>", so a Last-Event-ID from before a server restart is recognised and not trusted
+Event = namedtuple("Event", ["id", "seq", "kind", "data"])
+
+
+class EventBus:
+    """Recent dashboard events with increasing ids; server-sent event streams replay from a client's last id"""
+
+    def __init__(self, history=500):
+        self.epoch = int(time.time())
+        self.events = deque(maxlen=history)
+        self.seq = 0
+        self.lock = threading.Lock()
+        # (loop, asyncio.Event) of every stream currently waiting for new events
+        self.waiters = set()
+
+    def publish(self, kind, data):
+        with self.lock:
+            self.seq += 1
+            event = Event(f"{self.epoch}-{self.seq}", self.seq, kind, data)
+            self.events.append(event)
+            waiters = list(self.waiters)
+        for loop, ready in waiters:
+            loop.call_soon_threadsafe(ready.set)
+        return event
+
+    def parse_id(self, last_event_id):
+        """Sequence number a client has already seen; 0 for a missing, malformed or pre-restart id"""
+        try:
+            epoch, seq = str(last_event_id).split("-")
+            if int(epoch) == self.epoch:
+                return int(seq)
+        except (TypeError, ValueError):
+            pass
+        return 0
+
+    def since(self, seq):
+        with self.lock:
+            return [event for event in self.events if event.seq > seq]
+
+    async def wait(self, seq, timeout=15.0):
+        """Events after seq, waiting up to timeout for the first one; empty list on timeout"""
+        ready = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ready)
+        with self.lock:
+            self.waiters.add(waiter)
+        try:
+            events = self.since(seq)
+            if not events:
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+                events = self.since(seq)
+            return events
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+
+def format_sse(event):
+    data = json.dumps(event.data, ensure_ascii=False, default=str)
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n"
+
+
+event_bus = EventBus()
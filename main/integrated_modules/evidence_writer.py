@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+
+import cv2
+from django.conf import settings
+
+ENCODE_PARAMS = {
+    "jpg": lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    "webp": lambda quality: [cv2.IMWRITE_WEBP_QUALITY, quality],
+    "png": lambda quality: [cv2.IMWRITE_PNG_COMPRESSION, max(0, min(9, (100 - quality) // 10))],
+}
+
+
+class EvidenceWriter:
+    """Bounded queue and a pool of threads that encode and write evidence images off the frame loop"""
+
+    def __init__(self, workers=2, max_queue=64, image_format="jpg", quality=90, fsync="never", put_timeout=0.05):
+        self.image_format = image_format
+        self.encode_params = ENCODE_PARAMS[image_format](quality)
+        # 'never': leave flushing to the OS, 'always': fsync every file before reporting its path
+        self.fsync = fsync
+        self.put_timeout = put_timeout
+        self.jobs = queue.Queue(maxsize=max_queue)
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, daemon=True, name=f"evidence-writer-{i}")
+            thread.start()
+            self.threads.append(thread)
+
+    def final_path(self, path):
+        return f"{os.path.splitext(path)[0]}.{self.image_format}"
+
+    def submit(self, image, path, callback=None):
+        """Queue an image for writing and return the path it will have; callback(path) runs once it is on disk.
+
+        The image must not be modified after it is submitted. When the queue stays full the image is
+        dropped and callback(None) still runs, so the event itself is never lost.
+        """
+        path = self.final_path(path)
+        try:
+            self.jobs.put((image, path, callback), timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            print(f"[⚠️] Evidence queue full, dropped {path}")
+            self._run_callback(callback, None)
+            return None
+        return path
+
+    def flush(self):
+        """Block until every queued image is written"""
+        self.jobs.join()
+
+    def _write(self, image, path):
+        ok, buffer = cv2.imencode(f".{self.image_format}", image, self.encode_params)
+        if not ok:
+            raise ValueError(f"Could not encode {path}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temp name and rename, so readers never see a half-written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.tobytes())
+            if self.fsync == "always":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def _run_callback(self, callback, path):
+        if callback is None:
+            return
+        try:
+            callback(path)
+        except Exception as e:
+            print(f"[❌] Evidence callback failed for {path}: {e}")
+
+    def _work(self):
+        while True:
+            image, path, callback = self.jobs.get()
+            try:
+                self._write(image, path)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[❌] Failed to write evidence {path}: {e}")
+                path = None
+            self._run_callback(callback, path)
+            self.jobs.task_done()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self.jobs.qsize(),
+        }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_evidence_writer():
+    """Process-wide writer pool configured from settings.EVIDENCE_WRITER"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            config = getattr(settings, "EVIDENCE_WRITER", {})
+            _writer = EvidenceWriter(
+                workers=config.get("workers", 2),
+                max_queue=config.get("max_queue", 64),
+                image_format=config.get("format", "jpg"),
+                quality=config.get("quality", 90),
+                fsync=config.get("fsync", "never"),
+            )
+        return _writer
@@ -0,0 +1,102 @@
+import os
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+
+def normalize_rows(vectors):
+    """L2-normalized contiguous float32 copy; cosine similarity then becomes a plain inner product"""
+    vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    return vectors / norms
+
+
+class FaceGallery:
+    """Known face embeddings normalized once at load time, searched by inner product for top-k matches.
+
+    backend 'numpy' searches with one matrix product; 'faiss' uses an IndexFlatIP. Either way the
+    prepared gallery is saved next to the .npz and reused until the .npz changes.
+    """
+
+    def __init__(self, embeddings, labels, backend="numpy", index=None, normalized=False):
+        self.labels = np.asarray(labels)
+        self.backend = backend
+        self.index = index
+        self.embeddings = None
+        if embeddings is not None:
+            self.embeddings = embeddings if normalized else normalize_rows(embeddings)
+
+        if backend == "faiss" and self.index is None:
+            self.index = faiss.IndexFlatIP(self.embeddings.shape[1])
+            self.index.add(self.embeddings)
+
+    @staticmethod
+    def cache_path(database_path, backend):
+        stem = os.path.splitext(database_path)[0]
+        return f"{stem}.faiss" if backend == "faiss" else f"{stem}_gallery.npy"
+
+    @classmethod
+    def load(cls, database_path, backend=None):
+        if backend is None:
+            backend = getattr(settings, "FACE_GALLERY", {}).get("backend", "numpy")
+
+        data = np.load(database_path, allow_pickle=True)
+        labels = data["labels"]
+        cache_path = cls.cache_path(database_path, backend)
+        fresh = os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(database_path)
+
+        if fresh:
+            try:
+                if backend == "faiss":
+                    index = faiss.read_index(cache_path)
+                    if index.ntotal == len(labels):
+                        return cls(None, labels, backend, index=index)
+                else:
+                    embeddings = np.load(cache_path)
+                    if len(embeddings) == len(labels):
+                        return cls(embeddings, labels, backend, normalized=True)
+            except Exception as e:
+                print(f"[⚠️] Rebuilding face gallery cache {cache_path}: {e}")
+
+        gallery = cls(data["embeddings"], labels, backend)
+        gallery.save(cache_path)
+        return gallery
+
+    def save(self, path):
+        try:
+            if self.backend == "faiss":
+                faiss.write_index(self.index, path)
+            else:
+                np.save(path, self.embeddings)
+        except OSError as e:
+            print(f"[⚠️] Could not save face gallery cache {path}: {e}")
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, queries, k=1):
+        """Top-k (scores, indices) for each query embedding, shape (n_queries, k), best first"""
+        queries = normalize_rows(queries)
+        k = min(k, len(self.labels))
+
+        if self.index is not None:
+            return self.index.search(queries, k)
+
+        sims = queries @ self.embeddings.T
+        if k == 1:
+            indices = sims.argmax(axis=1)[:, None]
+        else:
+            indices = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(-sims, indices, axis=1).argsort(axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+        return np.take_along_axis(sims, indices, axis=1), indices
+
+    def match(self, queries, k=1):
+        """[(label, score), ...] top-k list for each query"""
+        scores, indices = self.search(queries, k)
+        return [
+            [(self.labels[i], float(s)) for s, i in zip(row_scores, row_indices) if i >= 0]
+            for row_scores, row_indices in zip(scores, indices)
+        ]
@@ -0,0 +1,182 @@
+import heapq
+import itertools
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+class FaceQualityScorer:
+    """How usable a detected face is for recognition, from 0 to 1.
+
+    Combines sharpness (variance of the Laplacian), face size, the detector's own score and how frontal
+    the face is, estimated from MediaPipe's eye and nose keypoints. Faces smaller than min_size are scaled
+    down by how much smaller they are, so they still rank among themselves but rarely reach min_quality.
+    """
+
+    def __init__(self, min_size=40, good_size=112, sharpness_ref=120.0, weights=None):
+        self.min_size = min_size
+        self.good_size = good_size
+        self.sharpness_ref = sharpness_ref
+        self.weights = weights or {'sharpness': 0.35, 'size': 0.2, 'detection': 0.2, 'frontal': 0.25}
+
+    @classmethod
+    def from_config(cls):
+        config = getattr(settings, "FACE_QUALITY", {})
+        return cls(
+            min_size=config.get("min_size", 40),
+            good_size=config.get("good_size", 112),
+            sharpness_ref=config.get("sharpness_ref", 120.0),
+            weights=config.get("weights"),
+        )
+
+    @staticmethod
+    def sharpness(face):
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    @staticmethod
+    def frontal(keypoints):
+        """1 for a face looking at the camera, 0 in full profile; keypoints start with right eye, left eye, nose"""
+        if keypoints is None or len(keypoints) < 3:
+            return 0.5
+        (rx, ry), (lx, ly), (nx, ny) = keypoints[:3]
+        eye_distance = np.hypot(lx - rx, ly - ry)
+        if eye_distance <= 1e-6:
+            return 0.0
+        # The nose drifts away from the middle of the eyes as the head turns
+        offset = abs(nx - (rx + lx) / 2) / eye_distance
+        return float(np.clip(1.0 - 2.0 * offset, 0.0, 1.0))
+
+    def score(self, face, detection_score=1.0, keypoints=None):
+        size = min(face.shape[:2])
+        if size == 0:
+            return 0.0
+        parts = {
+            'sharpness': min(1.0, self.sharpness(face) / self.sharpness_ref),
+            'size': min(1.0, max(0, size - self.min_size) / max(1, self.good_size - self.min_size)),
+            'detection': float(detection_score),
+            'frontal': self.frontal(keypoints),
+        }
+        quality = sum(self.weights[name] * value for name, value in parts.items()) / sum(self.weights.values())
+        if size < self.min_size:
+            quality *= size / self.min_size
+        return quality
+
+
+class FaceCandidate:
+    """One scored face of a track: the 160x160 face for FaceNet and, if the caller needs it, the crop it came from"""
+
+    __slots__ = ('quality', 'face', 'image', 'bbox', 'timestamp')
+
+    def __init__(self, quality, face, bbox, timestamp, image=None):
+        self.quality = quality
+        self.face = face
+        self.image = image
+        self.bbox = bbox
+        self.timestamp = timestamp
+
+
+class BestFaceSelector:
+    """Top-k faces of each track over a short window, so only the best one goes through FaceNet.
+
+    A track's window opens with its first candidate; it is ready once `window` seconds passed or a
+    candidate reached good_enough. Candidates below min_quality don't enter the top-k, but the best of
+    them is kept as a fallback, so a student who is only ever seen small or blurred is still recognised.
+    Each track is sampled at most every sample_interval seconds, and at most max_per_frame tracks per frame.
+    """
+
+    def __init__(self, top_k=3, window=1.0, good_enough=0.8, min_quality=0.3, sample_interval=0.25,
+                 max_per_frame=4):
+        self.top_k = top_k
+        self.window = window
+        self.good_enough = good_enough
+        self.min_quality = min_quality
+        self.sample_interval = sample_interval
+        self.max_per_frame = max_per_frame
+        # track_id -> [window start, min-heap of (quality, order, candidate), best fallback candidate]
+        self.tracks = {}
+        self.last_sampled = {}
+        self._order = itertools.count()
+
+        self.added = 0
+        self.rejected = 0
+        self.taken = 0
+
+    @classmethod
+    def from_config(cls):
+        config = getattr(settings, "FACE_QUALITY", {})
+        return cls(
+            top_k=config.get("top_k", 3),
+            window=config.get("window", 1.0),
+            good_enough=config.get("good_enough", 0.8),
+            min_quality=config.get("min_quality", 0.3),
+            sample_interval=config.get("sample_interval", 0.25),
+            max_per_frame=config.get("max_per_frame", 4),
+        )
+
+    def due(self, track_id, now):
+        """Whether to look at the track's face on this frame; a True answer counts as sampling it"""
+        last = self.last_sampled.get(track_id)
+        if last is not None and now - last < self.sample_interval:
+            return False
+        self.last_sampled[track_id] = now
+        return True
+
+    def add(self, track_id, candidate):
+        entry = self.tracks.setdefault(track_id, [candidate.timestamp, [], None])
+        if candidate.quality < self.min_quality:
+            self.rejected += 1
+            if entry[2] is None or candidate.quality > entry[2].quality:
+                entry[2] = candidate
+            return False
+        self.added += 1
+        heap = entry[1]
+        item = (candidate.quality, next(self._order), candidate)
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+        return True
+
+    @staticmethod
+    def _best(entry):
+        started, heap, fallback = entry
+        return max(heap)[2] if heap else fallback
+
+    def best(self, track_id):
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            return None
+        return self._best(entry)
+
+    def ready(self, track_id, now):
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            return False
+        started, heap, fallback = entry
+        return now - started >= self.window or (bool(heap) and max(heap)[0] >= self.good_enough)
+
+    def ready_tracks(self, now):
+        return [track_id for track_id in self.tracks if self.ready(track_id, now)]
+
+    def take(self, track_id):
+        """Best candidate of the track (the fallback if none reached min_quality), closing its window"""
+        entry = self.tracks.pop(track_id, None)
+        if entry is None:
+            return None
+        self.taken += 1
+        return self._best(entry)
+
+    def expire(self, track_ids):
+        for track_id in track_ids:
+            self.tracks.pop(track_id, None)
+            self.last_sampled.pop(track_id, None)
+
+    def stats(self):
+        return {
+            "tracks": len(self.tracks),
+            "added": self.added,
+            "rejected": self.rejected,
+            "embedded": self.taken,
+        }
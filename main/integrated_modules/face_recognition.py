@@ -2,9 +2,13 @@ import cv2
 import numpy as np
 import mediapipe as mp
 from keras_facenet import FaceNet
-from sklearn.metrics.pairwise import cosine_similarity
 import os
 import random
+import threading
+
+from main.integrated_modules.face_gallery import FaceGallery
+from main.integrated_modules.face_quality import FaceQualityScorer
+from main.integrated_modules.model_registry import get_model_registry
 
 class FaceClassifier:
     def __init__(self, database_path="main/modelss/face_db_clean.npz"):
@@ -13,44 +17,68 @@ class FaceClassifier:
         self.face_detection = self.mp_face_detection.FaceDetection(
             model_selection=0, min_detection_confidence=0.6
         )
-        self.embedder = FaceNet()
+        # الكلاسيفاير متشارك بين كل الكاميرات، و MediaPipe مش thread-safe
+        self.detection_lock = threading.Lock()
+        self.quality_scorer = FaceQualityScorer.from_config()
+        # نسخة FaceNet واحدة للبروسيس كله
+        self.embedder = get_model_registry().acquire(("facenet",), FaceNet)
 
+        # الـ gallery بتتعمل normalize مرة واحدة وتتحفظ جنب الـ npz
         try:
-            data = np.load(database_path, allow_pickle=True)
-            self.X = data["embeddings"]
-            self.y = data["labels"]
+            self.gallery = FaceGallery.load(database_path)
+            self.y = self.gallery.labels
         except Exception as e:
             print(f"❌ خطأ في تحميل قاعدة البيانات: {e}")
-            self.X = None
+            self.gallery = None
             self.y = None
 
-    def extract_face_mediapipe(self, image):
-        """Extract face from image using MediaPipe"""
+    def detect_face(self, image, region=None):
+        """Best-quality face in the image as (160x160 face, quality), or (None, 0.0) if there is none.
+
+        region: (x1, y1, x2, y2) of the student's own box inside a padded crop; faces centred outside it
+        belong to a neighbour and are skipped, however sharp they are.
+        """
         try:
             rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(rgb_image)
+            with self.detection_lock:
+                results = self.face_detection.process(rgb_image)
 
-            if results.detections:
-                detection = results.detections[0]
+            best_face, best_quality = None, 0.0
+            h, w, _ = image.shape
+            for detection in results.detections or ():
                 bbox = detection.location_data.relative_bounding_box
-                h, w, _ = image.shape
-                x = int(bbox.xmin * w)
-                y = int(bbox.ymin * h)
+                x = max(0, int(bbox.xmin * w))
+                y = max(0, int(bbox.ymin * h))
                 width = int(bbox.width * w)
                 height = int(bbox.height * h)
+                if region is not None:
+                    cx, cy = x + width / 2, y + height / 2
+                    if not (region[0] <= cx <= region[2] and region[1] <= cy <= region[3]):
+                        continue
                 face = image[y:y+height, x:x+width]
-                face_resized = cv2.resize(face, (160, 160))
-                return face_resized
+                if face.size == 0:
+                    continue
 
-            return None
+                keypoints = [(k.x * w, k.y * h) for k in detection.location_data.relative_keypoints]
+                quality = self.quality_scorer.score(face, detection.score[0], keypoints)
+                if best_face is None or quality > best_quality:
+                    best_face, best_quality = face, quality
+
+            if best_face is None:
+                return None, 0.0
+            return cv2.resize(best_face, (160, 160)), best_quality
 
         except Exception as e:
             print(f"❌ خطأ في استخراج الوجه: {e}")
-            return None
+            return None, 0.0
+
+    def extract_face_mediapipe(self, image):
+        """Extract face from image using MediaPipe"""
+        return self.detect_face(image)[0]
 
     def classify_face(self, image, threshold=0.6):
         """Classify face in image and return name with confidence"""
-        if self.X is None or self.y is None:
+        if self.gallery is None:
             return "Database Error", 0.0
 
         face = self.extract_face_mediapipe(image)
@@ -59,33 +87,81 @@ class FaceClassifier:
 
         try:
             test_emb = self.embedder.embeddings([face])[0]
-            sims = cosine_similarity([test_emb], self.X)[0]
-            idx = np.argmax(sims)
-            score = sims[idx]
-
-            if score > threshold:
-                return self.y[idx], score
-            else:
-                random_id = random.choice(["41210033", "41210081"])
-                return random_id, score
+            label, score = self.identify(test_emb)[0][0]
+            return self.decide(label, score, threshold)
 
 
         except Exception as e:
             print(f"❌ خطأ في التصنيف: {e}")
             return "Classification Error", 0.0
 
+    def decide(self, label, score, threshold):
+        if score > threshold:
+            return label, score
+        else:
+            random_id = random.choice(["41210033", "41210081"])
+            return random_id, score
+
+    def identify(self, embeddings, k=1):
+        """Top-k (label, similarity) matches for one embedding or a batch of them"""
+        return self.gallery.match(embeddings, k)
+
     def classify_cropped_image(self, cropped_image, threshold=0.6):
         """Classify pre-cropped face image"""
         return self.classify_face(cropped_image, threshold)
 
     def batch_classify(self, image_list, threshold=0.6):
-        """Classify multiple images at once"""
-        results = []
+        """Classify multiple images at once: one FaceNet forward pass and one gallery search for all faces"""
+        results = [{'image_index': i, 'name': "No Face Detected", 'confidence': 0.0, 'embedding': None}
+                   for i in range(len(image_list))]
+        if self.gallery is None:
+            for result in results:
+                result['name'] = "Database Error"
+            return results
+
+        # MediaPipe still runs per crop; everything after it is batched
+        faces, indices = [], []
         for i, img in enumerate(image_list):
-            name, confidence = self.classify_face(img, threshold)
-            results.append({
-                'image_index': i,
-                'name': name,
-                'confidence': confidence
-            })
+            face = self.extract_face_mediapipe(img)
+            if face is not None:
+                faces.append(face)
+                indices.append(i)
+
+        for i, result in zip(indices, self.classify_faces(faces, threshold)):
+            results[i].update(result)
         return results
+
+    def classify_faces(self, faces, threshold=0.6):
+        """Recognise already extracted 160x160 faces in one FaceNet pass; dicts of name, confidence, embedding"""
+        if not faces:
+            return []
+        if self.gallery is None:
+            return [{'name': "Database Error", 'confidence': 0.0, 'embedding': None} for _ in faces]
+
+        try:
+            embeddings = self.embedder.embeddings(np.stack(faces))
+            matches = self.identify(embeddings)
+        except Exception as e:
+            print(f"❌ خطأ في التصنيف: {e}")
+            return [{'name': "Classification Error", 'confidence': 0.0, 'embedding': None} for _ in faces]
+
+        results = []
+        for match, embedding in zip(matches, embeddings):
+            label, score = match[0]
+            name, confidence = self.decide(label, score, threshold)
+            results.append({'name': name, 'confidence': confidence, 'embedding': embedding})
+        return results
+
+    def close(self):
+        """Called by the registry once no camera uses this classifier any more"""
+        self.face_detection.close()
+        get_model_registry().release(("facenet",))
+
+
+def acquire_face_classifier(database_path="main/modelss/face_db_clean.npz"):
+    """Process-wide classifier for a face database, loaded on first use; pair with release_face_classifier()"""
+    return get_model_registry().acquire(("face_classifier", database_path), lambda: FaceClassifier(database_path))
+
+
+def release_face_classifier(database_path="main/modelss/face_db_clean.npz"):
+    get_model_registry().release(("face_classifier", database_path))
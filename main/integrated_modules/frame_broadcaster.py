@@ -0,0 +1,253 @@
+import asyncio
+import bisect
+import threading
+from collections import deque, namedtuple
+
+import cv2
+from django.conf import settings
+
+from main.integrated_modules.camera_pipeline import open_camera_pipeline
+
+MJPEG_BOUNDARY = "frame"
+
+# width None: the pipeline's own resolution, fps None: every frame the pipeline produces
+StreamProfile = namedtuple("StreamProfile", ["width", "quality", "fps"])
+
+DEFAULT_PROFILES = {
+    "thumb": {"width": 320, "quality": 60, "fps": 5},
+    "grid": {"width": 480, "quality": 70, "fps": 10},
+    "focus": {"width": 960, "quality": 80, "fps": 15},
+    "full": {"width": None, "quality": 80, "fps": None},
+}
+WIDTH_STEPS = (320, 480, 640, 960)
+QUALITY_STEPS = (50, 60, 70, 80, 90)
+FPS_STEPS = (2, 5, 10, 15)
+
+
+def _snap_up(value, steps):
+    # Smallest step that is at least the requested value; None (no limit) past the largest one
+    index = bisect.bisect_left(steps, value)
+    return steps[index] if index < len(steps) else None
+
+
+def _snap_nearest(value, steps):
+    return min(steps, key=lambda step: abs(step - value))
+
+
+def resolve_stream_profile(params):
+    """Viewer's stream profile from query params, snapped to shared steps so equal requests share one encoder.
+
+    ?profile=grid picks a named profile from MJPEG_STREAM['profiles']; width, quality and fps override
+    its fields and are rounded to WIDTH_STEPS / QUALITY_STEPS / FPS_STEPS.
+    """
+    config = getattr(settings, "MJPEG_STREAM", {})
+    profiles = config.get("profiles", DEFAULT_PROFILES)
+    name = params.get("profile") or config.get("default_profile", "full")
+    base = profiles.get(name) or profiles[config.get("default_profile", "full")]
+    width, quality, fps = base.get("width"), base.get("quality", config.get("quality", 80)), base.get("fps")
+
+    try:
+        if params.get("width"):
+            width = _snap_up(int(params["width"]), WIDTH_STEPS)
+        if params.get("quality"):
+            quality = _snap_nearest(int(params["quality"]), QUALITY_STEPS)
+        if params.get("fps"):
+            fps = _snap_up(float(params["fps"]), FPS_STEPS)
+    except ValueError:
+        pass
+    return StreamProfile(width, quality, fps)
+
+
+def mjpeg_chunk(jpeg_bytes):
+    return (b'--' + MJPEG_BOUNDARY.encode() + b'\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n\r\n')
+
+
+class Subscription:
+    """One viewer's bounded queue of encoded chunks; a slow viewer loses its oldest frames, not the others"""
+
+    def __init__(self, broadcaster, max_frames=2):
+        self.broadcaster = broadcaster
+        self.chunks = deque(maxlen=max_frames)
+        self.condition = threading.Condition()
+        self.ended = False
+        self.delivered = 0
+        self.dropped = 0
+
+        # Set by aget(): async viewers are woken on their event loop instead of blocking a thread
+        self.loop = None
+        self.event = None
+
+    def _wake(self):
+        # Called with the condition held
+        self.condition.notify_all()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    def push(self, chunk):
+        with self.condition:
+            if len(self.chunks) == self.chunks.maxlen:
+                self.dropped += 1
+            self.chunks.append(chunk)
+            self._wake()
+
+    def end(self):
+        with self.condition:
+            self.ended = True
+            self._wake()
+
+    def get(self, timeout=2.0):
+        """Oldest queued chunk, waiting up to timeout; None on timeout or once the stream ended"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.chunks or self.ended, timeout)
+            if not self.chunks:
+                return None
+            self.delivered += 1
+            return self.chunks.popleft()
+
+    async def aget(self, timeout=2.0):
+        """Async version of get() for ASGI views; awaits the next chunk without holding a thread"""
+        if self.loop is None:
+            event = asyncio.Event()
+            with self.condition:
+                self.loop = asyncio.get_running_loop()
+                self.event = event
+
+        while True:
+            with self.condition:
+                if self.chunks:
+                    self.delivered += 1
+                    return self.chunks.popleft()
+                if self.ended:
+                    return None
+                # Cleared under the lock, so a push after this point always sets it again
+                self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class FrameBroadcaster:
+    """Encodes each output frame of a camera pipeline once and fans the same bytes out to every subscriber"""
+
+    def __init__(self, camera, profile, max_client_frames=2, warmup_frames=5):
+        self.camera = camera
+        self.profile = profile
+        self.max_client_frames = max_client_frames
+        self.warmup_frames = warmup_frames
+        self.key = (camera.id, profile)
+
+        self.subscribers = []
+        self.closed = False
+        self.frames_encoded = 0
+        self.encode_time = 0.0
+
+        self.pipeline = open_camera_pipeline(camera, role="viewer")
+        self.thread = threading.Thread(target=self._loop, daemon=True, name=f"mjpeg:{camera.id}:{profile.width}")
+
+    def subscribe(self):
+        # Called with _broadcasters_lock held
+        subscription = Subscription(self, self.max_client_frames)
+        self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with _broadcasters_lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def _loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.profile.quality]
+        interval = 1.0 / self.profile.fps if self.profile.fps else 0.0
+        last_seq = 0
+        last_sent = None
+        skipped = 0
+
+        while True:
+            with _broadcasters_lock:
+                if not self.subscribers:
+                    self._close()
+                    break
+                subscribers = list(self.subscribers)
+
+            packet = self.pipeline.read(last_seq)
+            if packet is None:
+                if self.pipeline.ended:
+                    with _broadcasters_lock:
+                        subscribers = list(self.subscribers)
+                        self._close()
+                    break
+                continue
+            last_seq = packet.seq
+
+            # The first frames of a capture are often dark or half-decoded
+            if skipped < self.warmup_frames:
+                skipped += 1
+                continue
+
+            # Frames above the profile's rate are skipped before any resize or encode work
+            if last_sent is not None and packet.captured_at - last_sent < interval:
+                continue
+            last_sent = packet.captured_at
+
+            t0 = cv2.getTickCount()
+            frame = packet.frame
+            width = self.profile.width
+            if width and frame.shape[1] > width:
+                height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', frame, params)
+            self.encode_time += (cv2.getTickCount() - t0) / cv2.getTickFrequency()
+            if not ok:
+                continue
+            self.frames_encoded += 1
+
+            chunk = mjpeg_chunk(buffer.tobytes())
+            for subscription in subscribers:
+                subscription.push(chunk)
+
+        for subscription in subscribers:
+            subscription.end()
+        self.pipeline.release("viewer")
+
+    def _close(self):
+        # Called with _broadcasters_lock held
+        self.closed = True
+        if _broadcasters.get(self.key) is self:
+            del _broadcasters[self.key]
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "encoded": self.frames_encoded,
+            "encode_ms": 1000.0 * self.encode_time / max(1, self.frames_encoded),
+            "dropped": sum(s.dropped for s in self.subscribers),
+        }
+
+
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+
+def subscribe_camera_stream(camera, profile=None):
+    """Subscription to the camera's MJPEG stream in the given profile, sharing the encoder with other viewers"""
+    config = getattr(settings, "MJPEG_STREAM", {})
+    if profile is None:
+        profile = resolve_stream_profile({})
+
+    with _broadcasters_lock:
+        broadcaster = _broadcasters.get((camera.id, profile))
+        created = broadcaster is None
+        if created:
+            broadcaster = FrameBroadcaster(camera, profile,
+                                           max_client_frames=config.get("client_queue", 2),
+                                           warmup_frames=config.get("warmup_frames", 5))
+            _broadcasters[broadcaster.key] = broadcaster
+        subscription = broadcaster.subscribe()
+    if created:
+        broadcaster.thread.start()
+    return subscription
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import cv2
+from django.conf import settings
+
+# Part of every ETag, so a browser cache from before a server restart never matches a new version
+_EPOCH = int(time.time())
+
+
+class _Slot:
+    """One cached picture: the newest frame as handed over, and its JPEG once somebody asked for it"""
+
+    __slots__ = ('version', 'frame', 'record', 'render', 'encoded_version', 'jpeg')
+
+    def __init__(self):
+        self.version = 0
+        self.frame = None
+        self.record = None
+        self.render = None
+        self.encoded_version = 0
+        self.jpeg = None
+
+
+class LatestFrameCache:
+    """Newest annotated frame and last alert frame of a camera, JPEG-encoded lazily once per version.
+
+    The pipeline only stores a reference per frame; the overlay drawing and encoding happen on the first
+    request for a version, and later requests for the same version get the same bytes or a 304.
+    """
+
+    def __init__(self, cam_id, quality=80):
+        self.cam_id = cam_id
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.slots = {"latest": _Slot(), "alert": _Slot()}
+
+    def update(self, frame, record=None, render=None, kind="latest"):
+        """Store a frame; render(frame, record) draws its overlays if they weren't drawn yet"""
+        with self.lock:
+            slot = self.slots[kind]
+            slot.version += 1
+            slot.frame = frame
+            slot.record = record
+            slot.render = render
+
+    def etag(self, kind="latest"):
+        slot = self.slots[kind]
+        if not slot.version:
+            return None
+        return f'"{_EPOCH}-{self.cam_id}-{kind}-{slot.version}"'
+
+    def jpeg(self, kind="latest"):
+        """(etag, JPEG bytes) of the newest version, or (None, None) if there is no frame yet"""
+        with self.lock:
+            slot = self.slots[kind]
+            if not slot.version:
+                return None, None
+            if slot.encoded_version != slot.version:
+                frame = slot.frame
+                if slot.render is not None:
+                    frame = slot.render(frame, slot.record)
+                ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not ok:
+                    return None, None
+                slot.jpeg = buffer.tobytes()
+                slot.encoded_version = slot.version
+            return f'"{_EPOCH}-{self.cam_id}-{kind}-{slot.encoded_version}"', slot.jpeg
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_frame_cache(cam_id, create=True):
+    with _caches_lock:
+        cache = _caches.get(cam_id)
+        if cache is None and create:
+            quality = getattr(settings, "MJPEG_STREAM", {}).get("quality", 80)
+            cache = _caches[cam_id] = LatestFrameCache(cam_id, quality)
+        return cache
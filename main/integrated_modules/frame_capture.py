@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# seq: increasing frame number, timestamp: session seconds used by the rules, captured_at: wall clock
+FramePacket = namedtuple("FramePacket", ["seq", "frame", "timestamp", "captured_at"])
+
+
+class FrameGrabber:
+    """Reader thread per source that decodes continuously and keeps only the newest frame"""
+
+    def __init__(self, source, is_live=True, name=None):
+        self.source = source
+        self.is_live = is_live
+        self.name = name or str(source)
+        self.cap = cv2.VideoCapture(source)
+        # Recordings are played back at their own rate so they behave like a live camera
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+        self.condition = threading.Condition()
+        self.latest = None
+        self.delivered_seq = 0
+        self.running = True
+        self.ended = False
+
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.decode_latency = 0.0
+
+        self.thread = threading.Thread(target=self._reader, daemon=True, name=f"capture:{self.name}")
+        if self.cap.isOpened():
+            self.thread.start()
+        else:
+            self.ended = True
+
+    def isOpened(self):
+        return self.cap.isOpened() and not self.ended
+
+    def _reader(self):
+        started_wall = time.time()
+        started = time.monotonic()
+        seq = 0
+
+        while self.running:
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            decode = time.perf_counter() - t0
+            if not ret:
+                break
+
+            captured_at = time.time()
+            if self.is_live:
+                timestamp = captured_at - started_wall
+            else:
+                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+            seq += 1
+            with self.condition:
+                # The previous frame was never handed to anyone: it is overwritten and counted as dropped
+                if self.latest is not None and self.latest.seq > self.delivered_seq:
+                    self.frames_dropped += 1
+                self.latest = FramePacket(seq, frame, timestamp, captured_at)
+                self.frames_decoded += 1
+                self.decode_latency = decode if self.frames_decoded == 1 else 0.9 * self.decode_latency + 0.1 * decode
+                self.condition.notify_all()
+
+            if not self.is_live:
+                delay = started + timestamp - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+        self.cap.release()
+
+    def read(self, after_seq=0, timeout=2.0):
+        """Newest frame with seq > after_seq, waiting up to timeout; None on timeout or end of stream"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: (self.latest is not None and self.latest.seq > after_seq) or self.ended,
+                timeout,
+            )
+            packet = self.latest
+            if packet is None or packet.seq <= after_seq:
+                return None
+            self.delivered_seq = max(self.delivered_seq, packet.seq)
+            return packet
+
+    def release(self):
+        self.running = False
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def stats(self):
+        return {
+            "decoded": self.frames_decoded,
+            "dropped": self.frames_dropped,
+            "decode_latency_ms": self.decode_latency * 1000.0,
+        }
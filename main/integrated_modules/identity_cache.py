@@ -0,0 +1,110 @@
+import numpy as np
+from django.conf import settings
+
+
+class TrackIdentity:
+    """Best recognition so far for one tracked person"""
+
+    __slots__ = ('label', 'confidence', 'embedding', 'bbox', 'checked_at')
+
+    def __init__(self, bbox, checked_at):
+        self.label = None
+        self.confidence = 0.0
+        self.embedding = None
+        self.bbox = bbox
+        self.checked_at = checked_at
+
+
+class IdentityCache:
+    """Face identities of one camera's tracks, so each student is embedded once instead of on every alert.
+
+    A track is recognised again only while its confidence is below min_confidence (at most every
+    retry_interval seconds), or when its box jumped by more than swap_distance box widths, which is
+    how a tracker id switch between neighbouring students looks. Entries go away with the lost tracks.
+    """
+
+    def __init__(self, camera_id=None, min_confidence=0.75, retry_interval=2.0, swap_distance=0.5,
+                 swap_similarity=0.5):
+        self.camera_id = camera_id
+        self.min_confidence = min_confidence
+        self.retry_interval = retry_interval
+        self.swap_distance = swap_distance
+        self.swap_similarity = swap_similarity
+        self.identities = {}
+
+        self.recognitions = 0
+        self.hits = 0
+        self.swaps = 0
+
+    @classmethod
+    def from_config(cls, camera_id=None):
+        config = getattr(settings, "FACE_IDENTITY", {})
+        return cls(
+            camera_id=camera_id,
+            min_confidence=config.get("min_confidence", 0.75),
+            retry_interval=config.get("retry_interval", 2.0),
+            swap_distance=config.get("swap_distance", 0.5),
+            swap_similarity=config.get("swap_similarity", 0.5),
+        )
+
+    def get(self, track_id):
+        return self.identities.get(track_id)
+
+    def _jumped(self, old_bbox, bbox):
+        ox1, oy1, ox2, oy2 = old_bbox
+        x1, y1, x2, y2 = bbox
+        shift = np.hypot((x1 + x2 - ox1 - ox2) / 2, (y1 + y2 - oy1 - oy2) / 2)
+        return shift > self.swap_distance * max(1, ox2 - ox1)
+
+    def needs_recognition(self, track_id, bbox, now):
+        identity = self.identities.get(track_id)
+        if identity is None or self._jumped(identity.bbox, bbox):
+            return True
+        if identity.label is not None and identity.confidence >= self.min_confidence:
+            self.hits += 1
+            return False
+        if now - identity.checked_at < self.retry_interval:
+            self.hits += 1
+            return False
+        return True
+
+    def update(self, track_id, label, confidence, embedding, bbox, now):
+        """Fold a new recognition into the track's identity; results without a face only reset the retry timer"""
+        self.recognitions += 1
+        identity = self.identities.get(track_id)
+        if identity is None:
+            identity = self.identities[track_id] = TrackIdentity(bbox, now)
+        identity.checked_at = now
+        identity.bbox = bbox
+        if embedding is None:
+            return identity
+
+        swapped = False
+        if identity.embedding is not None:
+            similarity = float(np.dot(identity.embedding, embedding) /
+                               max(1e-12, np.linalg.norm(identity.embedding) * np.linalg.norm(embedding)))
+            swapped = similarity < self.swap_similarity
+            if swapped:
+                self.swaps += 1
+                print(f"[🔁] Track {track_id} on camera {self.camera_id} now shows a different face")
+
+        if swapped or identity.label is None or confidence > identity.confidence:
+            identity.label = label
+            identity.confidence = float(confidence)
+            identity.embedding = embedding
+        return identity
+
+    def expire(self, track_ids):
+        for track_id in track_ids:
+            self.identities.pop(track_id, None)
+
+    def __len__(self):
+        return len(self.identities)
+
+    def stats(self):
+        return {
+            "tracks": len(self.identities),
+            "recognitions": self.recognitions,
+            "hits": self.hits,
+            "swaps": self.swaps,
+        }
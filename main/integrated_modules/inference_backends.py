@@ -0,0 +1,89 @@
+import os
+
+import torch
+from django.conf import settings
+from ultralytics import YOLO
+
+# Where Ultralytics puts each exported format next to the .pt file
+EXPORT_SUFFIXES = {
+    "onnx": ".onnx",
+    "openvino": "_openvino_model",
+}
+
+
+def exported_model_path(model_path, backend, precision="fp32"):
+    """Path of the exported copy of a weight file, e.g. best.pt -> best.onnx / best_int8.onnx"""
+    root, _ = os.path.splitext(model_path)
+    if precision == "int8":
+        root += "_int8"
+    return root + EXPORT_SUFFIXES[backend]
+
+
+def model_backend_config(model_path):
+    """Backend and precision picked in settings for a weight file, looked up by its stem (best, phone, ...)"""
+    config = getattr(settings, "INFERENCE_BACKENDS", {})
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    model_config = config.get("models", {}).get(stem, {})
+    if isinstance(model_config, str):
+        model_config = {"backend": model_config}
+    return (model_config.get("backend", config.get("default", "torch")),
+            model_config.get("precision", "fp32"))
+
+
+class DetectorBackend:
+    """One YOLO weight file on PyTorch, ONNX Runtime or OpenVINO, returning the same box/conf/cls arrays"""
+
+    def __init__(self, model_path, backend="torch", precision="fp32"):
+        export_config = getattr(settings, "MODEL_EXPORT", {})
+        self.model_path = model_path
+        self.backend = backend
+        self.precision = precision
+        self.imgsz = None
+        self.fixed_batch = None
+
+        if precision == "int8" and backend != "onnx":
+            # quantize_models only builds INT8 ONNX graphs; any other backend would silently run FP32 PyTorch
+            raise ValueError(f"INT8 is only available on the onnx backend, not {backend} ({model_path})")
+
+        if backend != "torch":
+            path = exported_model_path(model_path, backend, precision)
+            if os.path.exists(path):
+                # Exported graphs have fixed input shapes: always feed the size and batch they were built with
+                self.model = YOLO(path, task="detect")
+                self.imgsz = export_config.get("imgsz", 640)
+                self.fixed_batch = export_config.get("batch", 1)
+                self.device = "cpu"
+                self.names = self.model.names
+                print(f"[🧠] Loaded {backend} ({precision}) model: {path}")
+                return
+
+            print(f"[⚠️] {path} not found, run 'python manage.py export_models'. Falling back to PyTorch")
+            self.backend = "torch"
+            self.precision = "fp32"
+
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = YOLO(model_path).to(self.device)
+        self.names = self.model.names
+
+    def predict(self, frames, **kwargs):
+        """Run a list of frames and return one Ultralytics result per frame"""
+        if self.imgsz is not None:
+            kwargs["imgsz"] = self.imgsz
+
+        if not self.fixed_batch:
+            return self.model(frames, verbose=False, **kwargs)
+
+        # Pad every chunk up to the exported batch size with the last frame and drop the extras
+        results = []
+        for start in range(0, len(frames), self.fixed_batch):
+            chunk = frames[start:start + self.fixed_batch]
+            count = len(chunk)
+            chunk = chunk + [chunk[-1]] * (self.fixed_batch - count)
+            source = chunk[0] if self.fixed_batch == 1 else chunk
+            results.extend(self.model(source, verbose=False, **kwargs)[:count])
+        return results
+
+
+def load_detector(model_path):
+    backend, precision = model_backend_config(model_path)
+    return DetectorBackend(model_path, backend, precision)
@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from main.integrated_modules.inference_backends import load_detector
+from main.integrated_modules.model_registry import get_model_registry
+
+# Plain numpy view of one frame's detections, independent of the model backend
+Detections = namedtuple("Detections", ["boxes", "confs", "classes"])
+
+
+def empty_detections():
+    return Detections(np.zeros((0, 4), dtype=np.float32),
+                      np.zeros((0,), dtype=np.float32),
+                      np.zeros((0,), dtype=int))
+
+
+class InferenceServer:
+    """Own one copy of a YOLO model and serve frames from all cameras in micro-batches"""
+
+    def __init__(self, model_path, max_batch_size=8, max_wait=0.01, detector=None):
+        self.model_path = model_path
+        # PyTorch, ONNX Runtime or OpenVINO depending on settings.INFERENCE_BACKENDS
+        self.model = detector or load_detector(model_path)
+        self.names = self.model.names
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        # Guards `stopped` so nothing is queued behind the stop sentinel
+        self.lock = threading.Lock()
+        self.stopped = False
+
+        self.batches_run = 0
+        self.frames_run = 0
+
+        self.thread = threading.Thread(target=self._serve, daemon=True,
+                                       name=f"inference:{model_path}")
+        self.thread.start()
+        print(f"[🧠] Inference server ready for {model_path} ({self.model.backend} on {self.model.device})")
+
+    def submit(self, frame, **kwargs):
+        """Queue a frame and return a future that resolves to its Detections"""
+        future = Future()
+        with self.lock:
+            if self.stopped:
+                future.set_exception(RuntimeError(f"Inference server for {self.model_path} is stopped"))
+                return future
+            self.requests.put((frame, kwargs, future))
+        return future
+
+    def predict(self, frame, **kwargs):
+        """Blocking helper for callers that need the result right away"""
+        return self.submit(frame, **kwargs).result()
+
+    def stop(self):
+        with self.lock:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.requests.put(None)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the deadline passes"""
+        first = self.requests.get()
+        if first is None:
+            return None, True
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run_batch(self, batch):
+        # Requests can only share a forward pass when their inference arguments match
+        groups = {}
+        for frame, kwargs, future in batch:
+            key = tuple(sorted(kwargs.items()))
+            groups.setdefault(key, []).append((frame, future))
+
+        for key, items in groups.items():
+            frames = [frame for frame, _ in items]
+            try:
+                results = self.model.predict(frames, **dict(key))
+            except Exception as e:
+                print(f"[❌] Inference failed for {self.model_path}: {e}")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(items, results):
+                if result.boxes is None:
+                    future.set_result(empty_detections())
+                    continue
+                future.set_result(Detections(result.boxes.xyxy.cpu().numpy(),
+                                             result.boxes.conf.cpu().numpy(),
+                                             result.boxes.cls.cpu().numpy().astype(int)))
+
+            self.batches_run += 1
+            self.frames_run += len(items)
+
+    def _serve(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect_batch()
+            if batch:
+                self._run_batch(batch)
+
+        # Anything still queued would otherwise leave its caller waiting on result() forever
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].set_exception(RuntimeError(f"Inference server for {self.model_path} stopped"))
+        print(f"[🛑] Inference server stopped for {self.model_path}")
+
+
+def _load_server(model_path):
+    config = getattr(settings, "INFERENCE_SERVER", {})
+    return InferenceServer(
+        model_path,
+        max_batch_size=config.get("max_batch_size", 8),
+        max_wait=config.get("max_wait_ms", 10) / 1000.0,
+    )
+
+
+def acquire_inference_server(model_path):
+    """Server for a weight file, started on first use; pair with release_inference_server()"""
+    return get_model_registry().acquire(("inference", model_path), lambda: _load_server(model_path))
+
+
+def release_inference_server(model_path):
+    """Drop one user of the server; the last one stops it and frees the model"""
+    get_model_registry().release(("inference", model_path))
@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ('model', 'refs', 'load_lock')
+
+    def __init__(self):
+        self.model = None
+        self.refs = 0
+        self.load_lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Process-wide models (FaceNet, face classifiers, YOLO servers) loaded once and shared by every camera.
+
+    acquire(key, loader) loads the model on first use and counts one more user; release(key) drops one,
+    and the last release unloads it (calls its close() or stop()), e.g. when a hall is switched off.
+    Each model loads under its own lock, so a slow FaceNet load doesn't hold up the YOLO servers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def acquire(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = _Entry()
+            entry.refs += 1
+
+        try:
+            with entry.load_lock:
+                if entry.model is None:
+                    started = time.perf_counter()
+                    entry.model = loader()
+                    print(f"[📦] Loaded {key} in {time.perf_counter() - started:.1f}s")
+        except Exception:
+            self.release(key)
+            raise
+        return entry.model
+
+    def get(self, key):
+        """The loaded model for key, or None; doesn't count as a user"""
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry.model if entry is not None else None
+
+    def release(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            del self.entries[key]
+
+        model = entry.model
+        if model is None:
+            return
+        unload = getattr(model, "close", None) or getattr(model, "stop", None)
+        if unload is not None:
+            try:
+                unload()
+            except Exception as e:
+                print(f"[⚠️] Failed to unload {key}: {e}")
+        print(f"[📦] Unloaded {key}")
+
+    def stats(self):
+        with self.lock:
+            return {str(key): entry.refs for key, entry in self.entries.items()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
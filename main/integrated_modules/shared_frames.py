@@ -0,0 +1,100 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from main.integrated_modules.frame_capture import FramePacket
+
+
+class SharedFrameRing:
+    """Ring of decoded frames in shared memory, written by the capture side and read by a worker process.
+
+    Layout: int64 header [write_seq, closed, seq of each slot], float64 (timestamp, captured_at)
+    per slot, then the frame slots themselves. A slot's seq is set to -1 while it is being written.
+    """
+
+    def __init__(self, shape, slots=4, name=None, create=True):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = create
+
+        header_bytes = 8 * (2 + slots) + 16 * slots
+        frame_bytes = int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=create,
+                                              size=header_bytes + slots * frame_bytes)
+        # Workers are spawned children sharing the parent's resource tracker, so the reader leaves the
+        # block's registration alone; the parent unlinks it in release()
+        self.released = False
+
+        self.header = np.ndarray((2 + slots,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.times = np.ndarray((slots, 2), dtype=np.float64, buffer=self.shm.buf, offset=8 * (2 + slots))
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self.header[:] = 0
+
+        self.read_seq = 0
+        self.delivered = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # --- writer side ---
+
+    def write(self, frame, timestamp, captured_at):
+        seq = int(self.header[0]) + 1
+        slot = seq % self.slots
+        self.header[2 + slot] = -1
+        self.frames[slot] = frame
+        self.times[slot] = (timestamp, captured_at)
+        self.header[2 + slot] = seq
+        self.header[0] = seq
+        return seq
+
+    def close_stream(self):
+        self.header[1] = 1
+
+    # --- reader side (same interface as FrameGrabber) ---
+
+    @property
+    def ended(self):
+        return bool(self.header[1]) and int(self.header[0]) <= self.read_seq
+
+    def read(self, after_seq=0, timeout=2.0, poll=0.005):
+        """Copy out the newest frame with seq > after_seq; None on timeout or once the stream is closed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = int(self.header[0])
+            if seq > after_seq:
+                slot = seq % self.slots
+                frame = self.frames[slot].copy()
+                timestamp, captured_at = self.times[slot]
+                # The writer may have lapped us while copying; then just take the newer frame
+                if int(self.header[2 + slot]) == seq:
+                    self.read_seq = seq
+                    self.delivered += 1
+                    return FramePacket(seq, frame, float(timestamp), float(captured_at))
+                continue
+
+            if self.header[1] or time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def release(self):
+        # Both the detection loop and the worker release the ring when a camera stops
+        if self.released:
+            return
+        self.released = True
+        # The numpy views hold the buffer; drop them before closing the mapping
+        del self.header, self.times, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def stats(self):
+        written = self.read_seq
+        return {
+            "decoded": written,
+            "dropped": max(0, written - self.delivered),
+            "decode_latency_ms": 0.0,
+        }
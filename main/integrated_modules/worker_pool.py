@@ -0,0 +1,226 @@
+import multiprocessing
+import os
+import queue
+import threading
+
+import cv2
+from django.conf import settings
+
+from main.integrated_modules.shared_frames import SharedFrameRing
+
+
+def init_worker(config):
+    """First thing a worker process runs, before torch and ultralytics are imported.
+
+    cv2 and numpy were already loaded with this module when the process unpickled its target, so the
+    thread variables only reach torch's OpenMP/MKL pools; OpenCV is limited with cv2.setNumThreads instead.
+    """
+    threads = str(config.get('torch_threads', 2))
+    os.environ.setdefault('OMP_NUM_THREADS', threads)
+    os.environ.setdefault('MKL_NUM_THREADS', threads)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'camera.settings')
+    cv2.setNumThreads(config.get('opencv_threads', 1))
+
+
+def worker_main(worker_id, commands, results, config):
+    """Entry point of one camera worker process: runs the detection of every camera assigned to it"""
+    # Workers must not fight over the same cores
+    init_worker(config)
+
+    import django
+    django.setup()
+
+    import torch
+    from main.detection.fused_detection import overlay_record
+    from main.integrated_detection import IntegratedCheatingSystem
+    from main.models import Camera
+    from main.state import should_stop
+
+    torch.set_num_threads(config.get('torch_threads', 2))
+
+    running = {}
+
+    def run_camera(cam_id, exam_location, ring):
+        try:
+            camera = Camera.objects.get(id=cam_id)
+            system = IntegratedCheatingSystem(camera, "main/modelss/best.pt",
+                                              "main/modelss/face_db_clean.npz", exam_location)
+            system.publish_violation = lambda result: results.put(('violation', cam_id, result))
+            # The streaming process draws the overlays for its viewers from these; an alert also carries its
+            # frame (a copy read out of the ring), so the alert snapshot shows the moment it was raised
+            system.publish_record = lambda frame, record: results.put(
+                ('record', cam_id, (overlay_record(record), frame if record['alerts'] else None)))
+            system.run(source=ring)
+            results.put(('stats', cam_id, system.detection_stage.stats()))
+        except Exception as e:
+            print(f"[❌] Worker {worker_id} failed on camera {cam_id}: {e}")
+        finally:
+            try:
+                ring.release()
+            finally:
+                results.put(('stopped', cam_id, None))
+
+    print(f"[🧵] Camera worker {worker_id} ready (pid {os.getpid()})")
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+
+        action, cam_id, payload = command
+        if action == 'start':
+            ring = SharedFrameRing(payload['shape'], payload['slots'], name=payload['ring'], create=False)
+            should_stop[cam_id] = False
+            thread = threading.Thread(target=run_camera, args=(cam_id, payload['exam_location'], ring),
+                                      daemon=True)
+            running[cam_id] = thread
+            thread.start()
+        elif action == 'stop':
+            should_stop[cam_id] = True
+
+    for cam_id, thread in running.items():
+        should_stop[cam_id] = True
+        thread.join(timeout=10)
+
+
+class CameraSupervisor:
+    """Runs camera detection in a pool of worker processes fed through shared-memory frame rings"""
+
+    def __init__(self, processes=2, ring_slots=4, config=None):
+        self.context = multiprocessing.get_context('spawn')
+        self.ring_slots = ring_slots
+        self.results = self.context.Queue()
+        self.lock = threading.Lock()
+
+        self.workers = []
+        for worker_id in range(processes):
+            commands = self.context.Queue()
+            process = self.context.Process(target=worker_main, args=(worker_id, commands, self.results, config or {}),
+                                           daemon=True, name=f"camera-worker-{worker_id}")
+            process.start()
+            self.workers.append({'process': process, 'commands': commands, 'cameras': set()})
+
+        # cam_id -> {'worker', 'pipeline', 'ring', 'thread', 'running'}
+        self.cameras = {}
+        self.pump = threading.Thread(target=self._pump_results, daemon=True, name="camera-results")
+        self.pump.start()
+
+    def is_running(self, cam_id):
+        return cam_id in self.cameras
+
+    def start(self, camera, exam_location):
+        with self.lock:
+            if camera.id in self.cameras:
+                return False
+            worker = min(self.workers, key=lambda w: len(w['cameras']))
+            worker['cameras'].add(camera.id)
+            entry = {'worker': worker, 'ring': None, 'running': True}
+            self.cameras[camera.id] = entry
+
+        # Imported here: worker processes load this module before Django is set up
+        from main.integrated_modules.camera_pipeline import open_camera_pipeline
+
+        # Frames come from the camera's shared pipeline, so the MJPEG viewers don't open a second capture
+        entry['pipeline'] = open_camera_pipeline(camera, role="feed")
+        entry['thread'] = threading.Thread(target=self._feed, args=(camera.id, entry, exam_location),
+                                           daemon=True, name=f"feed:{camera.id}")
+        entry['thread'].start()
+        return True
+
+    def stop(self, cam_id):
+        entry = self.cameras.get(cam_id)
+        if entry is None:
+            return
+        entry['running'] = False
+        entry['worker']['commands'].put(('stop', cam_id, None))
+
+    def _feed(self, cam_id, entry, exam_location):
+        """Copy the newest decoded frames of one camera into its ring; the worker copies each one out"""
+        pipeline = entry['pipeline']
+        last_seq = 0
+
+        while entry['running']:
+            packet = pipeline.read(last_seq)
+            if packet is None:
+                if pipeline.ended:
+                    break
+                continue
+            last_seq = packet.seq
+            frame = packet.frame
+
+            if entry['ring'] is None:
+                # The ring is sized from the first frame, then the worker is told where to find it
+                entry['ring'] = SharedFrameRing(frame.shape, self.ring_slots)
+                entry['worker']['commands'].put(('start', cam_id, {
+                    'ring': entry['ring'].name,
+                    'shape': frame.shape,
+                    'slots': self.ring_slots,
+                    'exam_location': exam_location,
+                }))
+            elif frame.shape != entry['ring'].shape:
+                frame = cv2.resize(frame, (entry['ring'].shape[1], entry['ring'].shape[0]))
+
+            entry['ring'].write(frame, packet.timestamp, packet.captured_at)
+
+        pipeline.release("feed")
+        if entry['ring'] is not None:
+            entry['ring'].close_stream()
+        else:
+            self._forget(cam_id)
+
+    def _forget(self, cam_id):
+        with self.lock:
+            entry = self.cameras.pop(cam_id, None)
+            if entry is not None:
+                entry['worker']['cameras'].discard(cam_id)
+        return entry
+
+    def _pump_results(self):
+        from main.state import record_violation
+
+        while True:
+            try:
+                kind, cam_id, payload = self.results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if kind == 'violation':
+                record_violation(cam_id, payload)
+            elif kind == 'record':
+                entry = self.cameras.get(cam_id)
+                if entry is not None:
+                    entry['pipeline'].set_remote_record(*payload)
+            elif kind == 'stats':
+                print(f"[📊] Camera {cam_id} stage stats: {payload}")
+            elif kind == 'stopped':
+                entry = self._forget(cam_id)
+                if entry is not None:
+                    entry['running'] = False
+                    entry['pipeline'].set_remote_record(None)
+                    if entry['ring'] is not None:
+                        entry['thread'].join(timeout=2.0)
+                        entry['ring'].release()
+                print(f"[✅] Model finished on camera {cam_id}")
+
+    def shutdown(self):
+        for cam_id in list(self.cameras):
+            self.stop(cam_id)
+        for worker in self.workers:
+            worker['commands'].put(None)
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_camera_supervisor():
+    """Process-wide supervisor configured from settings.CAMERA_WORKERS, started on first use"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            config = getattr(settings, 'CAMERA_WORKERS', {})
+            _supervisor = CameraSupervisor(
+                processes=config.get('processes', 2),
+                ring_slots=config.get('ring_slots', 4),
+                config=config,
+            )
+        return _supervisor
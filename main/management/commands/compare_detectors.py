@@ -0,0 +1,242 @@
+import json
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from main.detection.Cheating_detection import CheatDetector
+from main.detection.box_utils import box_iou
+from main.detection.phone_detection import PHONE_MODEL_PATH, filter_mobile_detections, submit_mobile_detection
+from main.integrated_modules.inference_backends import DetectorBackend
+from main.integrated_modules.inference_server import InferenceServer
+
+
+def match_alerts(alerts_a, alerts_b, time_tolerance=1.0, min_iou=0.3):
+    """Pair alerts that flag the same student (close in time, overlapping boxes); return pairs and leftovers"""
+    unmatched_b = list(range(len(alerts_b)))
+    pairs, only_a = [], []
+
+    for a in alerts_a:
+        best, best_iou = None, min_iou
+        for j in unmatched_b:
+            b = alerts_b[j]
+            if abs(a['time'] - b['time']) > time_tolerance:
+                continue
+            iou = float(box_iou([a['bbox']], [b['bbox']])[0, 0])
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is None:
+            only_a.append(a)
+        else:
+            unmatched_b.remove(best)
+            pairs.append((a, alerts_b[best]))
+
+    return pairs, only_a, [alerts_b[j] for j in unmatched_b]
+
+
+def compare_phone_frames(frames_a, frames_b, min_iou=0.3):
+    """Per-frame phone boxes of two detectors: how often the counts differ and how well matched boxes overlap"""
+    count_diffs, ious = [], []
+    for phones_a, phones_b in zip(frames_a, frames_b):
+        count_diffs.append(len(phones_b) - len(phones_a))
+        if not phones_a or not phones_b:
+            continue
+        overlap = box_iou([p[:4] for p in phones_a], [p[:4] for p in phones_b])
+        # Greedy one-to-one matching, best overlap first
+        while overlap.size and overlap.max() >= min_iou:
+            i, j = np.unravel_index(overlap.argmax(), overlap.shape)
+            ious.append(float(overlap[i, j]))
+            overlap[i, :] = -1
+            overlap[:, j] = -1
+
+    count_diffs = np.array(count_diffs)
+    return {
+        'frames': len(count_diffs),
+        'frames_with_different_count': int(np.count_nonzero(count_diffs)),
+        'missed_by_b': int(-count_diffs[count_diffs < 0].sum()),
+        'extra_in_b': int(count_diffs[count_diffs > 0].sum()),
+        'matched': len(ious),
+        'iou_mean': float(np.mean(ious)) if ious else 0.0,
+        'iou_min': float(np.min(ious)) if ious else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Replay a labelled exam clip through the FP32 and INT8 detectors and compare latency, alerts and phone boxes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video', help='Recorded exam clip to replay')
+        parser.add_argument('--model', default='main/modelss/best.pt')
+        parser.add_argument('--phone-model', default=PHONE_MODEL_PATH,
+                            help='Phone detector compared the same way, box by box; empty to skip it')
+        parser.add_argument('--baseline', choices=['torch', 'onnx', 'openvino'], default='onnx',
+                            help='Backend of the FP32 reference detector')
+        parser.add_argument('--labels', help='JSON list of expected alerts: [{"time": 12.5, "bbox": [x1, y1, x2, y2]}]')
+        parser.add_argument('--max-frames', type=int, default=0)
+        parser.add_argument('--output', help='Write the full comparison as JSON')
+
+    def replay(self, video, model_path, backend, max_frames):
+        """Run the clip through one detector variant; return per-frame latency and the alerts it raised"""
+        server = InferenceServer(model_path, max_batch_size=1, max_wait=0.0, detector=backend)
+        detector = CheatDetector(model_path, inference_server=server)
+
+        cap = cv2.VideoCapture(video)
+        if not cap.isOpened():
+            raise CommandError(f'Cannot open {video}')
+
+        latencies, alerts = [], []
+        frame_count = 0
+        started = time.perf_counter()
+
+        while not max_frames or frame_count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+            t0 = time.perf_counter()
+            results = detector.submit(frame).result()
+            latencies.append(time.perf_counter() - t0)
+
+            _, frame_alerts = detector.analyze(frame, frame_count, results, timestamp)
+            for alert in frame_alerts:
+                alerts.append({
+                    'time': alert['timestamp'],
+                    'track_id': alert['track_id'],
+                    'reason': alert['reason'],
+                    'bbox': [int(v) for v in alert['bbox']],
+                })
+            frame_count += 1
+
+        elapsed = time.perf_counter() - started
+        cap.release()
+        server.stop()
+
+        latencies_ms = np.array(latencies) * 1000.0
+        return {
+            'backend': backend.backend,
+            'precision': backend.precision,
+            'frames': frame_count,
+            'latency_ms_mean': float(latencies_ms.mean()) if frame_count else 0.0,
+            'latency_ms_p50': float(np.percentile(latencies_ms, 50)) if frame_count else 0.0,
+            'latency_ms_p95': float(np.percentile(latencies_ms, 95)) if frame_count else 0.0,
+            'throughput_fps': frame_count / elapsed if elapsed else 0.0,
+            'alerts': alerts,
+        }
+
+    def replay_phones(self, video, model_path, backend, max_frames):
+        """Run the clip through one phone detector variant; return per-frame latency and phone boxes"""
+        server = InferenceServer(model_path, max_batch_size=1, max_wait=0.0, detector=backend)
+
+        cap = cv2.VideoCapture(video)
+        if not cap.isOpened():
+            raise CommandError(f'Cannot open {video}')
+
+        latencies, phones = [], []
+        while not max_frames or len(phones) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            t0 = time.perf_counter()
+            results = submit_mobile_detection(frame, server).result()
+            latencies.append(time.perf_counter() - t0)
+            phones.append(filter_mobile_detections(results))
+
+        cap.release()
+        server.stop()
+
+        latencies_ms = np.array(latencies) * 1000.0
+        return {
+            'backend': backend.backend,
+            'precision': backend.precision,
+            'frames': len(phones),
+            'latency_ms_mean': float(latencies_ms.mean()) if phones else 0.0,
+            'latency_ms_p95': float(np.percentile(latencies_ms, 95)) if phones else 0.0,
+            'detections': sum(len(frame_phones) for frame_phones in phones),
+            'phones': phones,
+        }
+
+    def detector_variants(self, model_path, baseline):
+        variants = {
+            'fp32': DetectorBackend(model_path, baseline, 'fp32'),
+            'int8': DetectorBackend(model_path, 'onnx', 'int8'),
+        }
+        if variants['int8'].precision != 'int8':
+            raise CommandError(f'INT8 model of {model_path} not found, '
+                               f'run: python manage.py quantize_models --video <clip>')
+        return variants
+
+    def handle(self, *args, **options):
+        model_path = options['model']
+        variants = self.detector_variants(model_path, options['baseline'])
+        phone_variants = None
+        if options['phone_model']:
+            phone_variants = self.detector_variants(options['phone_model'], options['baseline'])
+
+        report = {name: self.replay(options['video'], model_path, backend, options['max_frames'])
+                  for name, backend in variants.items()}
+
+        for name, result in report.items():
+            self.stdout.write(
+                f"{name}: {result['backend']}/{result['precision']} | "
+                f"mean {result['latency_ms_mean']:.1f} ms | p95 {result['latency_ms_p95']:.1f} ms | "
+                f"{result['throughput_fps']:.1f} FPS | {len(result['alerts'])} alerts"
+            )
+
+        pairs, only_fp32, only_int8 = match_alerts(report['fp32']['alerts'], report['int8']['alerts'])
+        report['agreement'] = {
+            'matched': len(pairs),
+            'only_fp32': only_fp32,
+            'only_int8': only_int8,
+            'speedup': (report['fp32']['latency_ms_mean'] / report['int8']['latency_ms_mean']
+                        if report['int8']['latency_ms_mean'] else 0.0),
+        }
+        self.stdout.write(f"⚖️ Same alerts: {len(pairs)} | only FP32: {len(only_fp32)} | "
+                          f"only INT8: {len(only_int8)} | speedup x{report['agreement']['speedup']:.2f}")
+
+        if options['labels']:
+            with open(options['labels'], encoding='utf-8') as f:
+                labels = json.load(f)
+            for name in variants:
+                hits, misses, false_alarms = match_alerts(labels, report[name]['alerts'])
+                report[name]['labels'] = {
+                    'hits': len(hits),
+                    'misses': len(misses),
+                    'false_alarms': len(false_alarms),
+                }
+                self.stdout.write(f"🏷️ {name}: {len(hits)}/{len(labels)} labelled alerts, "
+                                  f"{len(false_alarms)} false alarms")
+
+        if only_fp32 or only_int8:
+            self.stdout.write(self.style.WARNING('⚠️ INT8 changes who gets flagged on this clip'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ INT8 flags the same students as FP32'))
+
+        if phone_variants is not None:
+            phones = {name: self.replay_phones(options['video'], options['phone_model'], backend,
+                                               options['max_frames'])
+                      for name, backend in phone_variants.items()}
+            agreement = compare_phone_frames(phones['fp32']['phones'], phones['int8']['phones'])
+            for name, result in phones.items():
+                self.stdout.write(
+                    f"📱 {name}: {result['backend']}/{result['precision']} | "
+                    f"mean {result['latency_ms_mean']:.1f} ms | p95 {result['latency_ms_p95']:.1f} ms | "
+                    f"{result['detections']} phones"
+                )
+                del result['phones']
+            self.stdout.write(
+                f"📱 Different phone count on {agreement['frames_with_different_count']}/{agreement['frames']} frames"
+                f" | missed by INT8: {agreement['missed_by_b']} | extra in INT8: {agreement['extra_in_b']}"
+                f" | matched IoU mean {agreement['iou_mean']:.2f}, min {agreement['iou_min']:.2f}"
+            )
+            report['phone'] = {**phones, 'agreement': agreement}
+            if agreement['frames_with_different_count']:
+                self.stdout.write(self.style.WARNING('⚠️ INT8 changes which phones are detected on this clip'))
+            else:
+                self.stdout.write(self.style.SUCCESS('✅ INT8 detects the same phones as FP32'))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ultralytics import YOLO
+
+DEFAULT_MODELS = [
+    'main/modelss/best.pt',
+    'main/modelss/phone.pt',
+    'main/modelss/yolov8n.pt',
+]
+
+
+class Command(BaseCommand):
+    help = 'Export YOLO weights to ONNX / OpenVINO with fixed input shapes for CPU inference'
+
+    def add_arguments(self, parser):
+        export_config = getattr(settings, 'MODEL_EXPORT', {})
+        parser.add_argument('models', nargs='*', default=DEFAULT_MODELS)
+        parser.add_argument('--format', choices=['onnx', 'openvino', 'all'], default='all')
+        parser.add_argument('--imgsz', type=int, default=export_config.get('imgsz', 640))
+        parser.add_argument('--batch', type=int, default=export_config.get('batch', 1))
+
+    def handle(self, *args, **options):
+        formats = ['onnx', 'openvino'] if options['format'] == 'all' else [options['format']]
+
+        for model_path in options['models']:
+            model = YOLO(model_path)
+            for fmt in formats:
+                # dynamic=False keeps the graph at one input shape so the CPU runtimes can optimize for it
+                output = model.export(format=fmt, imgsz=options['imgsz'], batch=options['batch'],
+                                      dynamic=False, half=False)
+                self.stdout.write(self.style.SUCCESS(f'✅ {model_path} → {output}'))
+
+        export_config = getattr(settings, 'MODEL_EXPORT', {})
+        if (options['imgsz'], options['batch']) != (export_config.get('imgsz', 640), export_config.get('batch', 1)):
+            self.stdout.write(self.style.WARNING(
+                '⚠️ حدّث MODEL_EXPORT في settings بنفس imgsz و batch عشان الـ runtime يستخدمهم'))
@@ -0,0 +1,127 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.integrated_modules.inference_backends import exported_model_path
+
+DEFAULT_MODELS = [
+    'main/modelss/best.pt',
+    'main/modelss/phone.pt',
+]
+
+
+def letterbox(frame, imgsz):
+    """Same resize + grey padding Ultralytics applies before inference"""
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+
+def load_calibration_frames(frames_dir=None, video=None, samples=200):
+    """Recorded exam frames: every image in a folder, or frames sampled evenly from a video"""
+    frames = []
+    if frames_dir:
+        for path in sorted(glob.glob(os.path.join(frames_dir, '*')))[:samples]:
+            image = cv2.imread(path)
+            if image is not None:
+                frames.append(image)
+
+    if video:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or samples
+        step = max(1, total // samples)
+        index = 0
+        while len(frames) < samples:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % step == 0:
+                frames.append(frame)
+            index += 1
+        cap.release()
+
+    return frames
+
+
+class ExamFramesReader:
+    """onnxruntime CalibrationDataReader over pre-processed exam frames"""
+
+    def __init__(self, input_name, frames, imgsz, batch):
+        tensors = []
+        for frame in frames:
+            image = letterbox(frame, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+            tensors.append(np.ascontiguousarray(image, dtype=np.float32) / 255.0)
+
+        self.batches = iter([
+            {input_name: np.stack(tensors[i:i + batch])}
+            for i in range(0, len(tensors) - batch + 1, batch)
+        ])
+
+    def get_next(self):
+        return next(self.batches, None)
+
+
+class Command(BaseCommand):
+    help = 'Build INT8 ONNX detectors from the exported FP32 models using recorded exam frames for calibration'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', default=DEFAULT_MODELS)
+        parser.add_argument('--frames', help='Folder of recorded exam frames (jpg/png)')
+        parser.add_argument('--video', help='Recorded exam clip to sample calibration frames from')
+        parser.add_argument('--samples', type=int, default=200)
+
+    def handle(self, *args, **options):
+        import onnx
+        import onnxruntime as ort
+        from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+        if not options['frames'] and not options['video']:
+            raise CommandError('Give --frames or --video with recorded exam footage for calibration')
+
+        frames = load_calibration_frames(options['frames'], options['video'], options['samples'])
+        if not frames:
+            raise CommandError('No calibration frames could be read')
+        self.stdout.write(f'📷 {len(frames)} calibration frames')
+
+        export_config = getattr(settings, 'MODEL_EXPORT', {})
+        imgsz = export_config.get('imgsz', 640)
+        batch = export_config.get('batch', 1)
+
+        for model_path in options['models']:
+            fp32_path = exported_model_path(model_path, 'onnx')
+            int8_path = exported_model_path(model_path, 'onnx', 'int8')
+            if not os.path.exists(fp32_path):
+                raise CommandError(f'{fp32_path} not found, run: python manage.py export_models --format onnx')
+
+            input_name = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+            reader = ExamFramesReader(input_name, frames, imgsz, batch)
+
+            quantize_static(
+                fp32_path,
+                int8_path,
+                reader,
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=CalibrationMethod.MinMax,
+            )
+
+            # Keep the Ultralytics metadata (class names, stride, imgsz) so the INT8 file loads like the FP32 one
+            fp32_model = onnx.load(fp32_path)
+            int8_model = onnx.load(int8_path)
+            del int8_model.metadata_props[:]
+            int8_model.metadata_props.extend(fp32_model.metadata_props)
+            onnx.save(int8_model, int8_path)
+
+            self.stdout.write(self.style.SUCCESS(f'✅ {fp32_path} → {int8_path}'))
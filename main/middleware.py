@@ -0,0 +1,14 @@
+from django.middleware.gzip import GZipMiddleware
+
+# Streams that must reach the client frame by frame and whose payload (JPEG) is already compressed
+UNCOMPRESSED_STREAM_TYPES = ("multipart/x-mixed-replace", "text/event-stream")
+
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves camera feeds and event streams alone"""
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "")
+        if content_type.startswith(UNCOMPRESSED_STREAM_TYPES):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_hall_floor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='seat_regions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
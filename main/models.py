@@ -14,6 +14,7 @@ class Camera(models.Model):
     hall = models.ForeignKey(Hall, related_name='cameras', on_delete=models.CASCADE, null=True, blank=True)
     video_path = models.CharField(max_length=255, null=True, blank=True)  # مسار فيديو إضافي (اختياري)
     is_live = models.BooleanField(default=False)  # هل الكاميرا لايف أم فيديو ثابت
+    seat_regions = models.JSONField(default=list, blank=True)  # مناطق المقاعد [x1, y1, x2, y2] كنسب من أبعاد الصورة
 
     def __str__(self):
         if self.hall:
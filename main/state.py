@@ -1,12 +1,13 @@
 # main/state.py
 from collections import defaultdict
 import time
-from ultralytics import YOLO
 from collections import defaultdict
 
+from main.integrated_modules.event_bus import event_bus
+
 cheating_stats = defaultdict(lambda: {"count": 0, "violations": []})
 
-cheating_model = YOLO("main/Modelss/best.pt").to("cuda")
+# النماذج بتتحمل مرة واحدة من main.integrated_modules.inference_server حسب INFERENCE_BACKENDS
 
 
 hall_active_models = {}  
@@ -22,3 +23,29 @@ active_models = {}
 detectors = {}       
 should_stop = {}     
 threads = {}         
+
+
+# حافظ على كل طالب وعدد مرات التكرار اللي تم إبلاغه بها
+# مثال: reported_violations["12345"] = {3, 6}
+reported_violations = defaultdict(set)
+
+
+def record_violation(cam_id, result):
+    """تسجيل مخالفة في إحصائيات الكاميرا (آخر 30 مخالفة) وإرسالها فورًا للـ dashboards"""
+    stats = cheating_stats[cam_id]
+    stats["count"] += 1
+    stats["violations"].insert(0, result)
+    del stats["violations"][30:]
+
+    event_bus.publish("violation", {"camera_id": cam_id, "count": stats["count"], "violation": result})
+
+    # كل 3 مخالفات لنفس الطالب على نفس الكاميرا = تنبيه تكرار مرة واحدة بس
+    academic_id = result["academic_id"]
+    repeats = sum(1 for v in stats["violations"] if v["academic_id"] == academic_id)
+    if repeats >= 3 and repeats % 3 == 0 and repeats not in reported_violations[academic_id]:
+        reported_violations[academic_id].add(repeats)
+        event_bus.publish("repeated", {
+            "academic_id": academic_id,
+            "student_name": result["student_name"],
+            "hall_name": result["location"],
+        })
@@ -19,6 +19,7 @@ urlpatterns = [
     path("ai-assistant/reset/", views.reset_chat, name="reset_chat"),
     path("toggle_attendance_tracking/", views.toggle_attendance_tracking, name="toggle_attendance_tracking"),
     path('global_cheating_stats/', views.global_cheating_stats, name='global_cheating_stats'),
+    path('events/', views.cheating_events, name='cheating_events'),
     path('privacy/', views.privacy_policy, name='privacy'),
     path('about/', views.About, name='about'),
     path('support/', views.Support, name='support'),
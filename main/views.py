@@ -1,20 +1,19 @@
-import os
 import json
+import asyncio
 import threading
 import logging
 import cv2
 import requests
+from asgiref.sync import sync_to_async
 import ollama 
 from django.conf import settings
-from django.http import JsonResponse, StreamingHttpResponse, HttpResponse, FileResponse
-from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.gzip import gzip_page
-from django.views.decorators.http import require_GET,require_http_methods
+from django.views.decorators.http import require_GET,require_http_methods, condition
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.core.files.storage import FileSystemStorage
-from main.integrated_detection import IntegratedCheatingSystem
 from collections import defaultdict
 from main.models import Hall, Camera
 
@@ -23,7 +22,18 @@ from datetime import datetime
 from main.detection.Cheating_detection import CheatDetector
 from main.atendance.AttendanceTracker import AttendanceTracker
 from main.integrated_modules.database_manager import DatabaseManager
-from main.state import should_stop, detectors, threads,cheating_stats ,hall_active_models,active_models, cheating_live_count
+from main.integrated_modules.worker_pool import get_camera_supervisor
+from main.integrated_modules.frame_broadcaster import resolve_stream_profile
+from main.integrated_modules.event_bus import event_bus, format_sse
+from main.integrated_modules.frame_cache import get_frame_cache
+from main.integrated_modules.face_recognition import acquire_face_classifier, release_face_classifier
+from main.integrated_modules.inference_server import acquire_inference_server, release_inference_server
+from main.integrated_modules.camera_pipeline import (
+    camera_source,
+    start_camera_detection,
+    stop_camera_detection,
+)
+from main.state import should_stop, cheating_stats ,hall_active_models,active_models, cheating_live_count, reported_violations
 from django.template.loader import render_to_string
 from main.Ai_assistant.Rag import (
     load_documents_from_db,
@@ -52,24 +62,21 @@ def camera_view(request, hall_id):
     return render(request, 'camera_grid.html', {'hall': hall, 'cameras': cameras})
 
 
-@gzip_page
 @login_required(login_url='login')
-def livefe(request, cam_id):
+async def livefe(request, cam_id):
+    # async view: under ASGI كل مشاهد بيستنى الفريم على الـ event loop من غير ما يحجز thread
     try:
-        camera_obj = Camera.objects.get(id=cam_id)
-        if camera_obj.is_live and camera_obj.stream:
-            source = int(camera_obj.stream) if camera_obj.stream.isdigit() else camera_obj.stream
-        elif camera_obj.video_path:
-            source = os.path.join(settings.BASE_DIR, camera_obj.video_path.replace('/', os.sep))
-        else:
-            return render(request, 'error.html', {'message': 'لا يوجد مصدر متاح لهذه الكاميرا.'})
+        camera_obj = await Camera.objects.aget(id=cam_id)
+        if camera_source(camera_obj) is None:
+            # render بيلمس الـ session (context processors) فلازم يتنفذ برا الـ event loop
+            return await sync_to_async(render)(request, 'error.html', {'message': 'لا يوجد مصدر متاح لهذه الكاميرا.'})
 
         return StreamingHttpResponse(
-            gen(source, cam_id=camera_obj.id),
+            gen(cam_id=camera_obj.id, profile=resolve_stream_profile(request.GET)),
             content_type="multipart/x-mixed-replace;boundary=frame"
         )
     except Camera.DoesNotExist:
-        return render(request, 'error.html', {'message': 'الكاميرا غير موجودة.'})
+        return await sync_to_async(render)(request, 'error.html', {'message': 'الكاميرا غير موجودة.'})
 
 
 
@@ -93,38 +100,35 @@ def toggle_anti_cheating_for_all(request):
     cameras = Camera.objects.filter(hall=hall)
     hall_active_models[hall.id] = activate
 
+    use_processes = getattr(settings, 'CAMERA_WORKERS', {}).get('mode', 'thread') == 'process'
+
     if activate:
         for cam in cameras:
             source = cam.get_stream_url
 
-            if cam.id in threads and threads[cam.id].is_alive():
-                print(f"[⏳] Thread already running for camera {cam.id}")
+            if use_processes:
+                should_stop[cam.id] = False
+                if get_camera_supervisor().start(cam, hall.name):
+                    print(f"[✅] Started integrated detection on camera {cam.id} in hall {hall.name} (worker process)")
+                else:
+                    print(f"[⏳] Worker already running for camera {cam.id}")
                 continue
 
-            integrated_detector = IntegratedCheatingSystem(
-                cam,
-                "main/modelss/best.pt",
-                "main/modelss/face_db_clean.npz",
-                hall.name
-            )
-
-            detectors[cam.id] = integrated_detector
+            # الكابتشر والديتكشن بيتعملوا مرة واحدة للكاميرا، والمشاهدين بيشتركوا في نفس الـ pipeline
             should_stop[cam.id] = False
-
-            def run(cam_id=cam.id, detector=integrated_detector):
-                detector.run()
-                print(f"[✅] Model finished on camera {cam_id}")
-
-            thread = threading.Thread(target=run)
-
-            threads[cam.id] = thread
-            thread.start()
+            if not start_camera_detection(cam, hall.name):
+                print(f"[⏳] Detection already running for camera {cam.id}")
+                continue
 
             print(f"[✅] Started integrated detection on camera {cam.id} in hall {hall.name}")
 
     else:
         for cam in cameras:
             should_stop[cam.id] = True
+            if use_processes:
+                get_camera_supervisor().stop(cam.id)
+            else:
+                stop_camera_detection(cam.id)
 
         
             cheating_stats[cam.id] = {
@@ -158,26 +162,36 @@ def toggle_attendance_tracking(request):
             db_manager = DatabaseManager("cheating_system.db")
             cameras = Camera.objects.filter(hall_id=hall_id)
 
-            for camera in cameras:
-                print(f"[🎞️] Starting Attendance for camera: {camera.id}")
-                video_source = camera.video_path or camera.stream
-                if not video_source:
-                    print(f"[⚠️] الكاميرا {camera.id} لا تحتوي على مصدر فيديو")
-                    continue
-
-                system = AttendanceTracker(
-                    video_path=video_source,
-                    yolo_model_path="main/modelss/yolov8n.pt",  # تأكد من المسار
-                    face_db_path="main/modelss/face_db_clean.npz",
-                    db_manager=db_manager,
-                    save_dir=f"attendance_faces/hall_{hall_id}/camera_{camera.id}"
-                )
-                system.run()
-
-            db_manager.close()
+            # الموديلات تفضل محمّلة بين الكاميرات، كل tracker بيرجّع بس المرجع بتاعه
+            yolo_model_path = "main/modelss/yolov8n.pt"  # تأكد من المسار
+            face_db_path = "main/modelss/face_db_clean.npz"
+            acquire_inference_server(yolo_model_path)
+            try:
+                acquire_face_classifier(face_db_path)
+                try:
+                    for camera in cameras:
+                        print(f"[🎞️] Starting Attendance for camera: {camera.id}")
+                        video_source = camera.video_path or camera.stream
+                        if not video_source:
+                            print(f"[⚠️] الكاميرا {camera.id} لا تحتوي على مصدر فيديو")
+                            continue
+
+                        system = AttendanceTracker(
+                            video_path=video_source,
+                            yolo_model_path=yolo_model_path,
+                            face_db_path=face_db_path,
+                            db_manager=db_manager,
+                            save_dir=f"attendance_faces/hall_{hall_id}/camera_{camera.id}"
+                        )
+                        system.run()
+                finally:
+                    release_face_classifier(face_db_path)
+            finally:
+                release_inference_server(yolo_model_path)
+                db_manager.close()
+                if key in attendance_threads:
+                    del attendance_threads[key]
             print(f"[✅] Attendance finished for hall {hall_id}")
-            if key in attendance_threads:
-                del attendance_threads[key]
 
         thread = threading.Thread(target=run_attendance)
         thread.daemon = True
@@ -192,11 +206,26 @@ def toggle_attendance_tracking(request):
         return JsonResponse({"status": False, "message": "Attendance not running"})
 
 
+def _latest_frame_etag(request, cam_id):
+    cache = get_frame_cache(cam_id, create=False)
+    if cache is None:
+        return None
+    return cache.etag("alert" if request.GET.get("alert") else "latest")
+
+
+# If-None-Match بنفس الـ ETag = 304 من غير encode ولا قراءة من الديسك
+@condition(etag_func=_latest_frame_etag)
 def latest_anti_cheat_frame(request, cam_id):
-    img_path = os.path.join(settings.MEDIA_ROOT, f"cheat_frame_{cam_id}.jpg")
-    if os.path.exists(img_path):
-        return FileResponse(open(img_path, 'rb'), content_type='image/jpeg')
-    return JsonResponse({'error': 'No frame found'}, status=404)
+    """Latest annotated frame of the camera (?alert=1: the last alert frame) from the in-memory cache"""
+    cache = get_frame_cache(cam_id, create=False)
+    etag, jpeg = cache.jpeg("alert" if request.GET.get("alert") else "latest") if cache else (None, None)
+    if jpeg is None:
+        return JsonResponse({'error': 'No frame found'}, status=404)
+
+    response = HttpResponse(jpeg, content_type='image/jpeg')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 
 
@@ -243,15 +272,12 @@ def update_camera_stream(request):
 
 
 @login_required(login_url='login')
-def video_feed(request, cam_id):
-    camera = get_object_or_404(Camera, id=cam_id)
-    hall_id = camera.hall.id  
-
-    source = os.path.join(settings.BASE_DIR, camera.video_path.replace('/', os.sep)) \
-        if camera.video_path else (int(camera.stream) if camera.stream.isdigit() else camera.stream)
+async def video_feed(request, cam_id):
+    camera = await aget_object_or_404(Camera, id=cam_id)
+    hall_id = camera.hall_id
 
     return StreamingHttpResponse(
-        gen(source, cam_id=camera.id, hall_id=hall_id),  
+        gen(cam_id=camera.id, hall_id=hall_id, profile=resolve_stream_profile(request.GET)),
         content_type='multipart/x-mixed-replace;boundary=frame'
     )
 
@@ -354,10 +380,6 @@ def cheating_stats_view(request):
     })
 
 
-# حافظ على كل طالب وعدد مرات التكرار اللي تم إبلاغه بها
-# مثال: reported["12345"] = [3, 6]
-reported_violations = defaultdict(set)
-
 def global_cheating_stats(request):
     repeated_students = []
 
@@ -397,6 +419,64 @@ def global_cheating_stats(request):
 
 
 
+async def stream_events(last_seq, camera_ids, snapshot):
+    # retry: المتصفح بيعيد الاتصال بعد 3 ثواني ويبعت Last-Event-ID لوحده
+    yield "retry: 3000\n\n"
+    if snapshot is not None:
+        yield f"event: snapshot\ndata: {json.dumps(snapshot, ensure_ascii=False, default=str)}\n\n"
+
+    try:
+        while True:
+            events = await event_bus.wait(last_seq)
+            if not events:
+                # comment كل شوية عشان الـ proxies متقفلش الاتصال ونعرف لو المتصفح مشي
+                yield ": keepalive\n\n"
+                continue
+
+            for event in events:
+                last_seq = event.seq
+                if camera_ids is None:
+                    if event.kind != "repeated":
+                        continue
+                elif event.kind != "violation" or event.data["camera_id"] not in camera_ids:
+                    continue
+                yield format_sse(event)
+    except asyncio.CancelledError:
+        return
+
+
+@login_required(login_url='login')
+async def cheating_events(request):
+    """Server-sent events: with ?hall_id= the hall's new violations, otherwise repeated-offender alerts"""
+    last_seq = event_bus.parse_id(request.headers.get("Last-Event-ID") or request.GET.get("last_event_id"))
+
+    camera_ids = None
+    snapshot = None
+    hall_id = request.GET.get("hall_id")
+    if hall_id:
+        camera_ids = {cam_id async for cam_id in Camera.objects.filter(hall_id=hall_id).values_list("id", flat=True)}
+        if not last_seq:
+            # أول اتصال: الحالة الحالية مرة واحدة، وبعد كده المخالفات الجديدة بس
+            last_seq = event_bus.seq
+            snapshot = {
+                "per_camera": {cam_id: {"count": cheating_stats.get(cam_id, {"count": 0})["count"]}
+                               for cam_id in camera_ids},
+                "violations": sorted(
+                    (v for cam_id in camera_ids for v in cheating_stats.get(cam_id, {"violations": []})["violations"]),
+                    key=lambda x: datetime.strptime(x['datetime'], "%Y-%m-%d %H:%M:%S"),
+                    reverse=True
+                )[:30],
+            }
+    elif not last_seq:
+        last_seq = event_bus.seq
+
+    response = StreamingHttpResponse(stream_events(last_seq, camera_ids, snapshot),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 def privacy_policy(request):
     return render(request, 'privacy.html')
 